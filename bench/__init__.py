@@ -0,0 +1 @@
+"""Decoder and analysis benchmarks on synthetic firmware images."""
@@ -0,0 +1,221 @@
+"""
+Benchmark scenarios, timing, and result comparison.
+
+Each scenario is a synthetic image (fixed size, mix and seed, so the same
+image on every run) and times:
+
+- ``autoload``: decoding every instruction of the stream, linearly
+- ``traversal``: full recursive traversal analysis of a fresh Program
+- ``render``: rendering every traversed instruction, with a cold render cache
+- ``peak_bytes``: tracemalloc peak during traversal (timed separately)
+
+Times are the best of several repeats, in seconds. Results are written as JSON,
+which ``compare`` reads back to show the change between two runs.
+"""
+
+import argparse
+from dataclasses import asdict, dataclass
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Sequence
+
+from bench.synth import MIXES, generate, instruction_starts
+from k0s_dasm import ibase
+from k0s_dasm.analysis import Analyzer
+from k0s_dasm.base import Program
+from k0s_dasm.ibase import Instruction
+
+RESULTS_VERSION = 1
+"""Bump when the results JSON layout changes."""
+
+TIMES = ("autoload", "traversal", "render")
+"""Timed measurements, in seconds."""
+
+
+@dataclass(frozen=True)
+class Scenario:
+	"""Benchmark scenario: a synthetic image to measure."""
+
+	name: str
+	"""Scenario name, as used in the results."""
+
+	size: int
+	"""Image size in bytes."""
+
+	mix: str
+	"""Instruction mix name (see ``bench.synth.MIXES``)."""
+
+	seed: int
+	"""Generator seed."""
+
+
+SCENARIOS = (
+	Scenario("uniform-16k", 0x4000, "uniform", 1),
+	Scenario("branch-16k", 0x4000, "branch", 2),
+	Scenario("prefix-16k", 0x4000, "prefix", 3),
+	Scenario("callt-16k", 0x4000, "callt", 4),
+	Scenario("uniform-64k", 0x10000, "uniform", 5),
+)
+"""Standard scenarios."""
+
+
+def _best(func: Callable[[], Any], repeat: int) -> float:
+	"""Get the best time of several calls."""
+	best = float("inf")
+	for _ in range(repeat):
+		start = time.perf_counter()
+		func()
+		best = min(best, time.perf_counter() - start)
+	return best
+
+
+def measure(scenario: Scenario, repeat: int = 5) -> dict[str, Any]:
+	"""Run one scenario."""
+	flash = bytes(generate(scenario.size, scenario.mix, scenario.seed))
+	starts = instruction_starts(flash)
+
+	def autoload() -> None:
+		prog = Program(flash)
+		for pc in starts:
+			Instruction.autoload(prog, pc)
+
+	def traversal() -> Program:
+		prog = Program(flash)
+		Analyzer(prog).run()
+		return prog
+
+	prog = traversal()
+	instrs = [prog.instrs[pc] for pc in prog.instrs]
+
+	def render() -> None:
+		ibase._render_cache.clear()
+		for inst in instrs:
+			inst.render()
+
+	out: dict[str, Any] = asdict(scenario)
+	out["instructions"] = len(starts)
+	out["traversed"] = len(instrs)
+	out["autoload"] = _best(autoload, repeat)
+	out["traversal"] = _best(traversal, repeat)
+	out["render"] = _best(render, repeat)
+
+	tracemalloc.start()
+	try:
+		traversal()
+		out["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+	return out
+
+
+def _git_commit() -> str | None:
+	"""Get the current commit of the source tree, if it's a git checkout."""
+	try:
+		proc = subprocess.run(
+			["git", "rev-parse", "HEAD"],
+			cwd=os.path.dirname(os.path.abspath(__file__)),
+			capture_output=True,
+			text=True,
+			check=True,
+		)
+	except (OSError, subprocess.CalledProcessError):
+		return None
+	return proc.stdout.strip()
+
+
+def run(scenarios: Sequence[Scenario], repeat: int = 5) -> dict[str, Any]:
+	"""Run scenarios, giving the results document."""
+	Instruction.decode_tree()  # built once, not part of any timing
+	results = {}
+	for scenario in scenarios:
+		results[scenario.name] = measure(scenario, repeat)
+		sys.stderr.write(_format_result(results[scenario.name]) + "\n")
+	return {
+		"version": RESULTS_VERSION,
+		"commit": _git_commit(),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"time": time.time(),
+		"repeat": repeat,
+		"results": results,
+	}
+
+
+def _format_result(result: dict[str, Any]) -> str:
+	"""Format one scenario's results as a line."""
+	times = "  ".join([f"{name} {result[name] * 1000:8.2f}ms" for name in TIMES])
+	return f"{result['name']:<12} {times}  peak {result['peak_bytes'] / 1024:8.0f}KiB"
+
+
+def compare(old: dict[str, Any], new: dict[str, Any]) -> list[str]:
+	"""Compare two results documents, giving a line per scenario and metric."""
+	lines = [f"old: {old.get('commit')}", f"new: {new.get('commit')}"]
+	for name, result in new["results"].items():
+		if name not in old["results"]:
+			continue
+		before = old["results"][name]
+		for metric in TIMES + ("peak_bytes",):
+			ratio = result[metric] / before[metric] if before[metric] else float("inf")
+			lines.append(
+				f"{name:<12} {metric:<10} {before[metric]:>12.6g} -> "
+				f"{result[metric]:>12.6g}  ({(ratio - 1) * 100:+6.1f}%)"
+			)
+	return lines
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+	"""Run the benchmark command line interface."""
+	parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__)
+	commands = parser.add_subparsers(dest="command", required=True)
+
+	cmd = commands.add_parser("run", help="run scenarios, write results JSON")
+	cmd.add_argument("-o", "--output", default="-", help="results file (default: stdout)")
+	cmd.add_argument("-r", "--repeat", type=int, default=5, help="repeats per timing")
+	cmd.add_argument(
+		"-s",
+		"--scenario",
+		action="append",
+		choices=[s.name for s in SCENARIOS],
+		help="scenario to run (default: all), may be repeated",
+	)
+	cmd.add_argument("--codegen", action="store_true", help="use the generated decoder")
+
+	cmd = commands.add_parser("compare", help="compare two results files")
+	cmd.add_argument("old", help="baseline results file")
+	cmd.add_argument("new", help="new results file")
+
+	cmd = commands.add_parser("generate", help="write a synthetic image")
+	cmd.add_argument("output", help="image file to write")
+	cmd.add_argument("--size", type=lambda s: int(s, 0), default=0x4000)
+	cmd.add_argument("--mix", choices=list(MIXES), default="uniform")
+	cmd.add_argument("--seed", type=int, default=0)
+
+	args = parser.parse_args(argv)
+	if args.command == "run":
+		if args.codegen:
+			from k0s_dasm import codegen
+
+			codegen.install()
+		names = args.scenario or [s.name for s in SCENARIOS]
+		doc = run([s for s in SCENARIOS if s.name in names], args.repeat)
+		text = json.dumps(doc, indent=2) + "\n"
+		if args.output == "-":
+			sys.stdout.write(text)
+		else:
+			with open(args.output, "w") as f:
+				f.write(text)
+	elif args.command == "compare":
+		with open(args.old) as f:
+			old = json.load(f)
+		with open(args.new) as f:
+			new = json.load(f)
+		print("\n".join(compare(old, new)))
+	else:
+		with open(args.output, "wb") as f:
+			f.write(generate(args.size, args.mix, args.seed))
+	return 0
@@ -0,0 +1,201 @@
+"""
+Synthetic firmware image generator.
+
+Images are random streams of valid 78K/0S instructions, built from the
+definitions of an ISA variant (by default, those in ``instr.py``): each instruction is a random word for a
+definition, with the free (unmasked) bits random and redrawn until the
+definition's decoder accepts it. Branch targets are then pointed at
+instruction starts (within reach, for relative branches), the reset vector
+at the start of the stream, and the call table slots at random instruction
+starts, so traversal actually walks the stream.
+"""
+
+from dataclasses import dataclass
+import random
+from typing import Sequence, Type
+
+from k0s_dasm.base import Program
+from k0s_dasm.defs import (
+	CALLT_BASE,
+	DEFAULT_ISA,
+	OPT_BYTE_ADDR,
+	PREFIX_BYTE,
+	PROG_BASE,
+	VECT_BASE,
+)
+from k0s_dasm.field import Addr5
+from k0s_dasm.ibase import Instruction
+from k0s_dasm.registry import registry
+
+MAX_TRIES = 64
+"""Attempts at drawing a word a definition accepts, before giving up on it."""
+
+
+@dataclass(frozen=True)
+class Mix:
+	"""Relative weights of instruction categories in a generated stream."""
+
+	branch: float = 1.0
+	"""Weight of each definition with a branch target field."""
+
+	prefix: float = 1.0
+	"""Weight of each prefixed (``PREFIX_BYTE``) definition."""
+
+	callt: float = 1.0
+	"""Weight of each CALLT definition."""
+
+	other: float = 1.0
+	"""Weight of each other definition."""
+
+
+MIXES: dict[str, Mix] = {
+	"uniform": Mix(),
+	"branch": Mix(branch=8.0),
+	"prefix": Mix(prefix=8.0),
+	"callt": Mix(callt=64.0),
+}
+"""Named instruction mixes."""
+
+
+def branch_fields(cls: Type[Instruction]) -> list[int]:
+	"""Get the indices of a definition's branch target fields."""
+	flow_idx = getattr(cls.flow, "branch_field_idx", None)
+	return [
+		idx
+		for idx, fdef in enumerate(cls.field_defs)
+		if fdef.is_branch or idx == flow_idx
+	]
+
+
+def category(cls: Type[Instruction]) -> str:
+	"""Get the ``Mix`` category of a definition."""
+	if any([isinstance(fdef, Addr5) for fdef in cls.field_defs]):
+		return "callt"
+	if branch_fields(cls):
+		return "branch"
+	shift = 8 * (cls.bytecount - 1)
+	if (
+		cls.bytecount > 1
+		and (cls.mmask >> shift) == 0xFF
+		and (cls.match >> shift) == PREFIX_BYTE
+	):
+		return "prefix"
+	return "other"
+
+
+class Generator:
+	"""Random instruction stream generator, for a given mix and seed."""
+
+	def __init__(self, mix: Mix, seed: int, isa: str = DEFAULT_ISA) -> None:
+		"""Set up the definition weights, for an ISA variant's definitions."""
+		self.rng = random.Random(seed)
+		"""Random number generator; fixed seeds give identical images."""
+
+		self.definitions = list(registry(isa).definitions)
+		"""Definitions to draw from."""
+
+		self.weights = [
+			getattr(mix, category(cls)) for cls in self.definitions
+		]
+		"""Weight of each definition."""
+
+		self._scratch = Program(b"\xff" * PROG_BASE, isa=isa)
+
+	def word(self, cls: Type[Instruction]) -> int | None:
+		"""Draw a random instruction word that decodes as the definition."""
+		bits = 8 * cls.bytecount
+		free = ~cls.mmask & ((1 << bits) - 1)
+		for _ in range(MAX_TRIES):
+			word = cls.match | (self.rng.getrandbits(bits) & free)
+			if cls.from_word(self._scratch, PROG_BASE, word) is not None:
+				return word
+		return None
+
+	def stream(self, size: int) -> list[tuple[Type[Instruction], int]]:
+		"""Draw (definition, word) pairs, filling ``size`` bytes exactly."""
+		out: list[tuple[Type[Instruction], int]] = []
+		left = size
+		while left > 0:
+			(cls,) = self.rng.choices(self.definitions, self.weights)
+			if cls.bytecount > left:
+				fits = [d for d in self.definitions if d.bytecount <= left]
+				cls = self.rng.choice(fits)
+			word = self.word(cls)
+			if word is None:
+				continue
+			out.append((cls, word))
+			left -= cls.bytecount
+		return out
+
+	def _target(
+		self, starts: Sequence[int], idx: int, pc_next: int | None = None
+	) -> int:
+		"""
+		Pick a branch target for instruction ``idx``, among ``starts``.
+
+		If given the next PC, the target is within relative branch reach.
+		"""
+		if pc_next is None:
+			return self.rng.choice(starts)
+		lo, hi = idx, idx
+		while lo > 0 and starts[lo - 1] >= pc_next - 0x7F:
+			lo -= 1
+		while hi + 1 < len(starts) and starts[hi + 1] <= pc_next + 0x7F:
+			hi += 1
+		return starts[self.rng.randint(lo, hi)]
+
+	def image(self, size: int) -> bytearray:
+		"""Generate a flash image of ``size`` bytes (at most 64 KiB)."""
+		assert PROG_BASE < size <= 0x10000
+		flash = bytearray(b"\xff" * size)
+		stream = self.stream(size - PROG_BASE)
+		starts = []
+		pc = PROG_BASE
+		for cls, _ in stream:
+			starts.append(pc)
+			pc += cls.bytecount
+
+		flash[VECT_BASE : VECT_BASE + 2] = PROG_BASE.to_bytes(2, "little")
+		for addr in range(CALLT_BASE, OPT_BYTE_ADDR, 2):
+			flash[addr : addr + 2] = self.rng.choice(starts).to_bytes(2, "little")
+
+		for idx, (cls, word) in enumerate(stream):
+			pc = starts[idx]
+			for fidx in branch_fields(cls):
+				fdef = cls.field_defs[fidx]
+				if fdef.is_relative:
+					pc_next = pc + cls.bytecount
+					target = self._target(starts, idx, pc_next)
+					word = fdef.insert(word, target - pc_next)
+				else:
+					word = fdef.insert(word, self._target(starts, idx))
+			flash[pc : pc + cls.bytecount] = word.to_bytes(cls.bytecount, "big")
+		return flash
+
+
+def generate(
+	size: int, mix: Mix | str = "uniform", seed: int = 0, isa: str = DEFAULT_ISA
+) -> bytearray:
+	"""Generate a synthetic flash image (of an ISA variant)."""
+	if isinstance(mix, str):
+		mix = MIXES[mix]
+	return Generator(mix, seed, isa).image(size)
+
+
+def instruction_starts(
+	flash: bytes | bytearray, isa: str = DEFAULT_ISA
+) -> list[int]:
+	"""
+	Get the instruction addresses of a generated image, by linear decoding.
+
+	Raises ValueError (as ``Instruction.autoload``) if any instruction
+	doesn't decode. Overlapping definitions are only detected in validation
+	mode (see ``Instruction.set_validation``).
+	"""
+	prog = Program(flash, isa=isa)
+	out = []
+	pc = PROG_BASE
+	while pc < len(flash):
+		out.append(pc)
+		pc += Instruction.autoload(prog, pc).bytecount
+	return out
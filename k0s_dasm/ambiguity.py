@@ -0,0 +1,253 @@
+"""
+Exhaustive encoding-space ambiguity checker (requires NumPy).
+
+This enumerates every 4-byte decode window (the longest instruction word)
+against every definition's ``mmask``/``match`` and ``excludes``, to find
+windows more than one definition matches (overlaps, where ``autoload`` in
+validation mode would raise) and windows none does (undecodable gaps).
+
+Rather than 2**32 windows, the first two bytes are enumerated in full, and
+then only the bits below them that the remaining candidates care about, for
+the prefixes where that matters. Each enumerated window stands for all the
+windows that differ only in bits nothing looks at, and is counted as such.
+
+Definitions with a custom ``_check_fields`` can't be evaluated as arrays;
+their whole instruction word is enumerated and checked one by one.
+"""
+
+from dataclasses import dataclass, field
+import time
+from typing import Sequence, Type
+
+import numpy as np
+import numpy.typing as npt
+
+from k0s_dasm.base import Program
+from k0s_dasm.decode import WINDOW_BYTES
+from k0s_dasm.defs import DEFAULT_ISA, PROG_BASE
+from k0s_dasm.ibase import Instruction
+from k0s_dasm.registry import DefinitionInfo, registry
+
+_PREFIX_BITS = 16
+"""Window bits enumerated in full (the first two bytes)."""
+
+_LOW_BITS = 8 * WINDOW_BYTES - _PREFIX_BITS
+_LOW_MASK = (1 << _LOW_BITS) - 1
+
+MAX_EXAMPLES = 16
+"""Example windows kept per kind of finding."""
+
+
+@dataclass
+class Overlap:
+	"""Windows that the same set of several definitions all match."""
+
+	definitions: tuple[Type[Instruction], ...]
+	"""The definitions that all match."""
+
+	windows: int
+	"""Number of 4-byte windows matched by exactly these definitions."""
+
+	example: int
+	"""One such window."""
+
+
+@dataclass
+class AmbiguityReport:
+	"""Results of an exhaustive encoding-space check."""
+
+	overlaps: list[Overlap] = field(default_factory=list)
+	"""Sets of definitions with overlapping encodings."""
+
+	gap_windows: int = 0
+	"""Number of 4-byte windows nothing decodes."""
+
+	gap_prefixes: list[tuple[int, int]] = field(default_factory=list)
+	"""
+	Undecodable prefixes, as (value, byte count): first bytes where nothing
+	decodes, and two-byte prefixes (under first bytes where something does).
+	"""
+
+	partial_gaps: list[int] = field(default_factory=list)
+	"""Example undecodable windows, under otherwise decodable prefixes."""
+
+	prefixes_refined: int = 0
+	"""Two-byte prefixes that needed the bits below them enumerated."""
+
+	elapsed: float = 0.0
+	"""Check time, in seconds."""
+
+	@property
+	def ok(self) -> bool:
+		"""True iff no encodings overlap."""
+		return not self.overlaps
+
+	def report(self) -> str:
+		"""Describe the findings."""
+		space = 1 << (8 * WINDOW_BYTES)
+		lines = [
+			f"Encoding space check: {len(self.overlaps)} overlaps, "
+			f"{self.gap_windows / space:.2%} of windows undecodable "
+			f"({self.prefixes_refined} prefixes refined, {self.elapsed:.2f}s)"
+		]
+		for overlap in self.overlaps:
+			names = " | ".join([inst.mnemonic for inst in overlap.definitions])
+			lines.append(
+				f"\tOVERLAP {names}: {overlap.windows} windows, "
+				f"e.g. {overlap.example:08X}"
+			)
+		firsts = [val for val, count in self.gap_prefixes if count == 1]
+		seconds = [val for val, count in self.gap_prefixes if count == 2]
+		if firsts:
+			lines.append(
+				f"\tGAP first bytes ({len(firsts)}): "
+				+ " ".join([f"{val:02X}" for val in firsts])
+			)
+		if seconds:
+			lines.append(
+				f"\tGAP two-byte prefixes ({len(seconds)}), e.g. "
+				+ " ".join([f"{val:04X}" for val in seconds[:MAX_EXAMPLES]])
+			)
+		if self.partial_gaps:
+			lines.append(
+				"\tGAP windows under decodable prefixes, e.g. "
+				+ " ".join([f"{val:08X}" for val in self.partial_gaps])
+			)
+		return "\n".join(lines)
+
+
+def _has_check(inst: Type[Instruction]) -> bool:
+	"""Check if a definition has a custom ``_check_fields``."""
+	return inst._check_fields is not Instruction._check_fields
+
+
+def _info(inst: Type[Instruction]) -> DefinitionInfo:
+	"""Get the registry metadata of a definition."""
+	return registry(inst.isa).info(inst)
+
+
+def _low_bits(inst: Type[Instruction]) -> int:
+	"""Get the window bits below the prefix that a definition looks at."""
+	if _has_check(inst):
+		shift = 8 * (WINDOW_BYTES - inst.bytecount)
+		return (((1 << (8 * inst.bytecount)) - 1) << shift) & _LOW_MASK
+	info = _info(inst)
+	bits = info.window_mask & _LOW_MASK
+	for ex_mask, _ in info.excludes:
+		bits |= ex_mask & _LOW_MASK
+	return bits
+
+
+def _deposit(bits: int) -> npt.NDArray[np.uint32]:
+	"""Get every combination of the set bits of a mask, as an array."""
+	positions = [pos for pos in range(_LOW_BITS) if bits & (1 << pos)]
+	combos = np.arange(1 << len(positions), dtype=np.uint32)
+	out = np.zeros_like(combos)
+	for idx, pos in enumerate(positions):
+		out |= ((combos >> np.uint32(idx)) & np.uint32(1)) << np.uint32(pos)
+	return out
+
+
+def _matches(
+	inst: Type[Instruction], windows: npt.NDArray[np.uint32], scratch: Program
+) -> npt.NDArray[np.bool_]:
+	"""Evaluate a definition over some windows."""
+	info = _info(inst)
+	hits: npt.NDArray[np.bool_] = (windows & np.uint32(info.window_mask)) == np.uint32(
+		info.window_match
+	)
+	for ex_mask, ex_match in info.excludes:
+		hits &= (windows & np.uint32(ex_mask)) != np.uint32(ex_match)
+	if _has_check(inst):
+		shift = 8 * (WINDOW_BYTES - inst.bytecount)
+		for idx in np.flatnonzero(hits):
+			word = int(windows[idx]) >> shift
+			hits[idx] = inst.from_word(scratch, 0, word) is not None
+	return hits
+
+
+def _prefix_matrix(
+	definitions: Sequence[Type[Instruction]],
+) -> npt.NDArray[np.bool_]:
+	"""Match every definition against every two-byte prefix."""
+	prefixes = np.arange(1 << _PREFIX_BITS, dtype=np.uint32)
+	out = np.empty((len(prefixes), len(definitions)), dtype=np.bool_)
+	for col, inst in enumerate(definitions):
+		info = _info(inst)
+		hits = (prefixes & np.uint32(info.window_mask >> _LOW_BITS)) == np.uint32(
+			info.window_match >> _LOW_BITS
+		)
+		for ex_mask, ex_match in info.excludes:
+			if ex_mask & _LOW_MASK:
+				continue  # depends on lower bits too, left for refinement
+			hits &= (prefixes & np.uint32(ex_mask >> _LOW_BITS)) != np.uint32(
+				ex_match >> _LOW_BITS
+			)
+		out[:, col] = hits
+	return out
+
+
+def check(
+	definitions: Sequence[Type[Instruction]] | None = None, isa: str = DEFAULT_ISA
+) -> AmbiguityReport:
+	"""
+	Check the encoding space of the definitions of an ISA variant.
+
+	By default, all of the variant's definitions are checked.
+	"""
+	start = time.perf_counter()
+	if definitions is None:
+		definitions = registry(isa).definitions
+	scratch = Program(b"\xff" * PROG_BASE, isa=isa)  # erased tables, for flow lookups
+	report = AmbiguityReport()
+
+	matrix = _prefix_matrix(definitions)
+	low = np.array([_low_bits(inst) for inst in definitions], dtype=np.uint32)
+	deep = (low != 0) | np.array([_has_check(inst) for inst in definitions])
+	counts = matrix.sum(axis=1)
+	refine = (counts >= 2) | (matrix & deep).any(axis=1)
+
+	empty = counts == 0
+	report.gap_windows = int(empty.sum()) << _LOW_BITS
+	by_first = empty.reshape(256, 256)
+	for first in range(256):
+		if by_first[first].all():
+			report.gap_prefixes.append((first, 1))
+		else:
+			for second in np.flatnonzero(by_first[first]):
+				report.gap_prefixes.append(((first << 8) | int(second), 2))
+
+	overlaps: dict[tuple[int, ...], Overlap] = {}
+	for prefix in np.flatnonzero(refine):
+		report.prefixes_refined += 1
+		cols = np.flatnonzero(matrix[prefix])
+		bits = int(np.bitwise_or.reduce(low[cols]))
+		windows = (np.uint32(prefix) << np.uint32(_LOW_BITS)) | _deposit(bits)
+		weight = 1 << (_LOW_BITS - bin(bits).count("1"))
+
+		hits = np.array(
+			[_matches(definitions[int(col)], windows, scratch) for col in cols]
+		)
+		matched = hits.sum(axis=0)
+		gaps = np.flatnonzero(matched == 0)
+		report.gap_windows += len(gaps) * weight
+		for idx in gaps[: MAX_EXAMPLES - len(report.partial_gaps)]:
+			report.partial_gaps.append(int(windows[idx]))
+
+		for idx in np.flatnonzero(matched >= 2):
+			key = tuple(int(col) for col in cols[hits[:, idx]])
+			if key not in overlaps:
+				overlaps[key] = Overlap(
+					definitions=tuple(definitions[col] for col in key),
+					windows=0,
+					example=int(windows[idx]),
+				)
+			overlaps[key].windows += weight
+
+	report.overlaps = list(overlaps.values())
+	report.elapsed = time.perf_counter() - start
+	return report
+
+
+if __name__ == "__main__":
+	print(check().report())
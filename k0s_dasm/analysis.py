@@ -0,0 +1,240 @@
+"""Recursive traversal analysis."""
+
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+import heapq
+import time
+from typing import Iterable
+
+from k0s_dasm.base import Coverage, Program
+from k0s_dasm.ibase import Instruction
+from k0s_dasm.instrument import phase
+from k0s_dasm.vsa import resolve_jumps
+from k0s_dasm.xref import XrefCollector, XrefIndex
+
+
+class QueueOrder(Enum):
+	"""Order in which queued addresses are taken by the traversal."""
+
+	DFS = "dfs"
+	"""Most recently queued first (as the original script did)."""
+
+	BFS = "bfs"
+	"""Least recently queued first."""
+
+	ADDRESS = "address"
+	"""Lowest address first."""
+
+
+class _Worklist:
+	"""Queue of addresses to analyze, in some QueueOrder."""
+
+	def __init__(self, order: QueueOrder) -> None:
+		"""Create an empty worklist."""
+		self.order = order
+		self._items: deque[int] = deque()
+		self._heap: list[int] = []
+
+	def extend(self, pcs: Iterable[int]) -> None:
+		"""Queue some addresses."""
+		if self.order is QueueOrder.ADDRESS:
+			for pc in pcs:
+				heapq.heappush(self._heap, pc)
+		else:
+			self._items.extend(pcs)
+
+	def pop(self) -> int:
+		"""Get the next address, raising IndexError when empty."""
+		if self.order is QueueOrder.ADDRESS:
+			return heapq.heappop(self._heap)
+		elif self.order is QueueOrder.BFS:
+			return self._items.popleft()
+		else:
+			return self._items.pop()
+
+
+@dataclass
+class Walk:
+	"""One linear run of the traversal, starting from a queued address."""
+
+	start: int
+	"""The queued address."""
+
+	pcs: list[int] = field(default_factory=list)
+	"""Addresses of the instructions decoded, in order."""
+
+	bad: int | None = None
+	"""Address that couldn't be decoded, ending the walk, if any."""
+
+
+@dataclass
+class AnalysisStats:
+	"""Statistics about an analysis run."""
+
+	decodes: int = 0
+	"""Instructions decoded."""
+
+	bad: int = 0
+	"""Addresses that couldn't be decoded."""
+
+	wall_time: float = 0.0
+	"""Run time, in seconds."""
+
+	bytes_covered: int = 0
+	"""Flash bytes belonging to decoded instructions (in total)."""
+
+	overlaps: int = 0
+	"""Instructions decoded overlapping an already decoded instruction."""
+
+	jumps_resolved: int = 0
+	"""Computed jumps resolved by value-set analysis (in total)."""
+
+	jumps_unresolved: int = 0
+	"""Computed jumps left unresolved."""
+
+	vsa_steps: int = 0
+	"""Block transfers evaluated by value-set analysis."""
+
+
+@dataclass
+class AnalysisResult:
+	"""Results of an analysis run."""
+
+	program: Program
+	"""The analyzed Program, with the decoded instructions in ``instrs``."""
+
+	walks: list[Walk]
+	"""Walks that decoded anything (or failed to), in traversal order."""
+
+	coverage: Coverage
+	"""Code coverage of the Program after the run."""
+
+	xrefs: XrefIndex
+	"""Cross-references of all instructions decoded by the Analyzer so far."""
+
+	jumps: dict[int, tuple[int, ...]]
+	"""Resolved computed jump targets, by jump instruction address."""
+
+	stats: AnalysisStats
+	"""Statistics about the run."""
+
+
+class Analyzer:
+	"""
+	Recursive traversal disassembler.
+
+	Starting from the entry points, instructions are decoded linearly until
+	the flow ends (or an instruction was already decoded); any other next
+	addresses are queued for later.
+
+	When the queue runs out, computed jumps (BR AX) are resolved by value-set
+	analysis where possible, and their targets are queued in turn.
+	"""
+
+	def __init__(
+		self,
+		program: Program,
+		order: QueueOrder = QueueOrder.DFS,
+		resolve: bool = True,
+		max_rounds: int = 8,
+	) -> None:
+		"""Create an analyzer for the given program."""
+		self.program = program
+		"""The Program to analyze."""
+
+		self.order = order
+		"""Worklist queue order."""
+
+		self.xrefs = XrefCollector()
+		"""Cross-references, collected as instructions are decoded."""
+
+		self.resolve = resolve
+		"""Whether to resolve computed jumps."""
+
+		self.max_rounds = max_rounds
+		"""Maximum number of computed jump resolution rounds per run."""
+
+		self.jumps: dict[int, tuple[int, ...]] = {}
+		"""Resolved computed jump targets, by jump instruction address."""
+
+	def run(self, entry_points: Iterable[int] | None = None) -> AnalysisResult:
+		"""
+		Run the traversal.
+
+		By default, starts from the Program's entry points. Can be run again
+		with more entry points, which only analyzes what's new.
+		"""
+		prog = self.program
+		if entry_points is None:
+			entry_points = prog.entry_points()
+		stats = AnalysisStats()
+		walks: list[Walk] = []
+		start_time = time.perf_counter()
+		overlaps_before = len(prog.overlaps)
+
+		pcs = _Worklist(self.order)
+		pcs.extend(entry_points)
+		with phase("traverse"):
+			self._traverse(pcs, walks, stats)
+		for _ in range(self.max_rounds if self.resolve else 0):
+			with phase("resolve"):
+				vsa = resolve_jumps(prog, self.jumps)
+			stats.vsa_steps += vsa.steps
+			stats.jumps_unresolved = len(vsa.unresolved)
+			new = {pc: t for pc, t in vsa.jumps.items() if self.jumps.get(pc) != t}
+			if not new:
+				break
+			self.jumps.update(new)
+			for targets in new.values():
+				pcs.extend(targets)
+			with phase("traverse"):
+				self._traverse(pcs, walks, stats)
+
+		coverage = prog.coverage()
+		stats.bytes_covered = coverage.code_bytes
+		stats.overlaps = len({pc for pc, _ in prog.overlaps[overlaps_before:]})
+		stats.jumps_resolved = len(self.jumps)
+		stats.wall_time = time.perf_counter() - start_time
+		return AnalysisResult(
+			program=prog,
+			walks=walks,
+			coverage=coverage,
+			xrefs=self.xrefs.index(),
+			jumps=dict(self.jumps),
+			stats=stats,
+		)
+
+	def _traverse(self, pcs: _Worklist, walks: list[Walk], stats: AnalysisStats) -> None:
+		"""Decode from the queued addresses until the queue runs out."""
+		prog = self.program
+		while True:
+			# multi flow loop
+			try:
+				pc = pcs.pop()
+			except IndexError:
+				break
+			if pc in prog.instrs:
+				# already looked at this path
+				continue
+			walk = Walk(start=pc)
+			walks.append(walk)
+			while pc not in prog.instrs:
+				# single flow loop
+				try:
+					instr = Instruction.autoload(prog, pc)
+				except ValueError:
+					walk.bad = pc
+					stats.bad += 1
+					break
+
+				prog.instrs[instr.pc] = instr
+				self.xrefs.add(instr)
+				walk.pcs.append(instr.pc)
+				stats.decodes += 1
+
+				if len(instr.next) > 1:
+					pcs.extend(instr.next[1:])
+				if len(instr.next) < 1:
+					break
+				pc = instr.next[0]
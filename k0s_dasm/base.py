@@ -5,46 +5,285 @@ Other than Instruction, anyways. There were some circular dependencies.
 """
 
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING, ClassVar, Sequence
+import mmap
+import os
+import re
+import struct
+from typing import TYPE_CHECKING, ClassVar, Iterator, Sequence
+
+from k0s_dasm.defs import (
+	CALLT_BASE,
+	DEFAULT_ISA,
+	OPT_BYTE_ADDR,
+	UPD78F9202_VECT,
+	VECT_BASE,
+)
 
 if TYPE_CHECKING:
 	from k0s_dasm.ibase import Instruction
+	from k0s_dasm.registry import Registry
+	from k0s_dasm.table import InstructionTable
+
+Flash = bytes | bytearray | memoryview
+"""Flash data, any contiguous bytes-like object."""
+
+_DATA_WORD = struct.Struct("<H")
+
+CODE_NONE = 0
+"""Code map value: byte doesn't belong to any instruction (data?)."""
+
+CODE_HEAD = 1
+"""Code map value: first byte of an instruction."""
+
+CODE_BODY = 2
+"""Code map value: other byte of an instruction."""
+
+_CODE_BODY = bytes([CODE_BODY])
+_CODE_RUN = re.compile(b"[\x01\x02]+")
+
+
+@dataclass(frozen=True)
+class Coverage:
+	"""Summary of which flash bytes are code."""
+
+	code_bytes: int
+	"""Bytes belonging to instructions."""
+
+	data_bytes: int
+	"""Bytes not belonging to any instruction."""
+
+	instructions: int
+	"""Number of instructions."""
+
+	overlaps: int
+	"""Number of instructions overlapping another instruction."""
+
+	ranges: Sequence[tuple[int, int]]
+	"""Contiguous code ranges, as (start, end) with exclusive end."""
+
+
+@dataclass(frozen=True)
+class TableEntry:
+	"""One slot of the vector or call table."""
+
+	addr: int
+	"""Address of the slot."""
+
+	word: int | None
+	"""The address stored in the slot, or None if outside the flash."""
+
+	name: str
+	"""Name of the slot (interrupt source, or CALLT slot)."""
+
+	@property
+	def is_set(self) -> bool:
+		"""Check if the slot holds an address (i.e. isn't erased)."""
+		return self.word is not None and self.word != 0xFFFF
+
+
+@dataclass
+class VectorTables:
+	"""The vector and call tables, parsed once from the flash."""
+
+	vectors: tuple[TableEntry, ...]
+	"""Vector table slots, in address order."""
+
+	callt: tuple[TableEntry, ...]
+	"""Call table (CALLT) slots, in address order."""
+
+	callt_sites: dict[int, set[int]] = field(default_factory=dict)
+	"""Addresses of the CALLT instructions resolved so far, by slot address."""
+
+	@classmethod
+	def parse(cls, flash: Flash) -> "VectorTables":
+		"""Read the tables from flash data."""
+
+		def entry(addr: int, name: str) -> TableEntry:
+			word = None
+			if addr + 2 <= len(flash):
+				word = _DATA_WORD.unpack_from(flash, addr)[0]
+			return TableEntry(addr=addr, word=word, name=name)
+
+		vectors = tuple(
+			entry(addr, UPD78F9202_VECT.get(addr, f"VECT_{addr:02X}H"))
+			for addr in range(VECT_BASE, CALLT_BASE, 2)
+		)
+		callt = tuple(
+			entry(addr, f"CALLT_{addr:02X}H")
+			for addr in range(CALLT_BASE, OPT_BYTE_ADDR, 2)
+		)
+		return cls(vectors=vectors, callt=callt)
+
+	def entry_points(self) -> list[int]:
+		"""Get the addresses in all set slots, in slot order."""
+		return [
+			entry.word
+			for entry in self.vectors + self.callt
+			if entry.word is not None and entry.word != 0xFFFF
+		]
+
+	def callt_target(self, addr: int, site: int | None = None) -> int:
+		"""
+		Get the address in a call table slot, given the slot address.
+
+		If given the address of the CALLT instruction, it is recorded in
+		``callt_sites``.
+		"""
+		entry = self.callt[(addr - CALLT_BASE) >> 1]
+		if entry.word is None:
+			raise ValueError(f"Address OOB for 16-bit word: 0x{addr:04X}")
+		if site is not None:
+			self.callt_sites.setdefault(addr, set()).add(site)
+		return entry.word
 
 
 @dataclass
 class Program:
 	"""Assembly program and other flash contents."""
 
-	flash: bytearray
+	flash: Flash
 	"""The full flash data."""
 
 	pc: int = 0
 	"""A program counter mainly used during analysis."""
 
-	instrs: dict[int, "Instruction"] = field(default_factory=dict)
+	instrs: "InstructionTable" = field(init=False, repr=False)
 	"""
 	Instructions found in the program. Keys are absolute addresses.
 
-	No particular order or contiguity.
+	No particular order or contiguity. This is a compact table, which gives
+	a new Instruction view each time one is looked up.
 	"""
 
 	labels: dict[int, str] = field(default_factory=dict)
 	"""Labels found in the program. Keys are absolute addresses."""
 
+	code: bytearray = field(init=False, repr=False)
+	"""
+	Code map, one of the CODE_* values for each flash byte.
+
+	Kept up to date by ``instrs``. Where instructions overlap, any byte where
+	an instruction starts is CODE_HEAD.
+	"""
+
+	overlaps: list[tuple[int, int]] = field(default_factory=list)
+	"""
+	Overlapping instructions found, as (address, address of the other).
+
+	Typically from a jump into the middle of an already decoded instruction.
+	"""
+
+	tables: VectorTables = field(init=False, repr=False)
+	"""
+	Vector and call tables.
+
+	Parsed when the Program is created; it's possible the program could
+	change the call table later, but this would be a major operation as it's
+	in flash.
+	"""
+
+	isa: str = DEFAULT_ISA
+	"""ISA variant to decode the program as."""
+
+	registry: "Registry" = field(init=False, repr=False)
+	"""Instruction definition registry of the ISA variant."""
+
+	def __post_init__(self) -> None:
+		"""Set up the instruction table, code map and vector tables."""
+		# circular import
+		from k0s_dasm.registry import registry
+		from k0s_dasm.table import InstructionTable
+
+		self.registry = registry(self.isa)
+		self.code = bytearray(len(self.flash))
+		self.instrs = InstructionTable(self)
+		self.tables = VectorTables.parse(self.flash)
+
+	@classmethod
+	def from_file(
+		cls, path: str | os.PathLike[str], isa: str = DEFAULT_ISA
+	) -> "Program":
+		"""
+		Load a flash image file (of an ISA variant), memory-mapped read-only.
+
+		The flash is a read-only memoryview of the mapping, which stays open as
+		long as it is referenced.
+		"""
+		with open(path, "rb") as f:
+			if os.fstat(f.fileno()).st_size == 0:
+				return cls(memoryview(b""), isa=isa)  # can't map an empty file
+			mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		return cls(memoryview(mapping), isa=isa)
+
+	def is_code(self, addr: int) -> bool:
+		"""Check if a flash byte belongs to any instruction."""
+		return 0 <= addr < len(self.code) and self.code[addr] != CODE_NONE
+
+	def instr_start(self, addr: int) -> int | None:
+		"""Get the address of an instruction the flash byte belongs to, if any."""
+		if not self.is_code(addr):
+			return None
+		for start in range(addr, max(addr - 4, -1), -1):
+			length = self.instrs.length_of(start)
+			if length and start + length > addr:
+				return start
+		return None
+
+	def mark_code(self, pc: int, length: int) -> None:
+		"""Mark an instruction in the code map, noting any overlaps."""
+		span = self.code[pc : pc + length]
+		if span.count(CODE_NONE) == len(span):
+			self.code[pc] = CODE_HEAD
+			self.code[pc + 1 : pc + length] = _CODE_BODY * (length - 1)
+			return
+
+		others = {self.instr_start(addr) for addr in range(pc, pc + length)}
+		for other in sorted([a for a in others if a is not None and a != pc]):
+			self.overlaps.append((pc, other))
+		self._paint(pc, length)
+
+	def unmark_code(self, pc: int, length: int) -> None:
+		"""Remove an instruction from the code map."""
+		self.code[pc : pc + length] = bytes(length)
+		# restore any overlapping instructions
+		for start in range(max(pc - 3, 0), pc + length):
+			other_length = self.instrs.length_of(start)
+			if other_length and start != pc and start + other_length > pc:
+				self._paint(start, other_length)
+
+	def _paint(self, pc: int, length: int) -> None:
+		"""Mark an instruction in the code map, with any other starts kept."""
+		self.code[pc] = CODE_HEAD
+		for addr in range(pc + 1, pc + length):
+			if self.code[addr] == CODE_NONE:
+				self.code[addr] = CODE_BODY
+
+	def code_ranges(self) -> Iterator[tuple[int, int]]:
+		"""Get contiguous code ranges, as (start, end) with exclusive end."""
+		for m in _CODE_RUN.finditer(self.code):
+			yield m.start(), m.end()
+
+	def coverage(self) -> Coverage:
+		"""Summarize which flash bytes are code."""
+		data_bytes = self.code.count(CODE_NONE)
+		return Coverage(
+			code_bytes=len(self.code) - data_bytes,
+			data_bytes=data_bytes,
+			instructions=len(self.instrs),
+			overlaps=len({pc for pc, _ in self.overlaps}),
+			ranges=list(self.code_ranges()),
+		)
+
 	def flash_word(self, addr: int) -> int:
-		"""Read 16-bit big-endian word from the flash data."""
+		"""Read 16-bit little-endian word from the flash data."""
 		if not 0 <= addr <= (len(self.flash) - 2):
 			raise ValueError(f"Address OOB for 16-bit word: 0x{addr:04X}")
-		return int.from_bytes(self.flash[addr : addr + 2], "little", signed=False)
+		word: int = _DATA_WORD.unpack_from(self.flash, addr)[0]
+		return word
 
 	def entry_points(self) -> Sequence[int]:
 		"""Get all defined entry points in the vector and call tables."""
-		out: list[int] = []
-		for addr in range(0, 0x80, 2):
-			vect = self.flash_word(addr)
-			if vect != 0xFFFF:
-				out.append(vect)
-		return out
+		return self.tables.entry_points()
 
 
 @dataclass(frozen=True)
@@ -57,16 +296,51 @@ class Field:
 	is_branch: ClassVar[bool] = False
 	"""True iff the value is an absolute address that may be jumped to."""
 
+	is_relative: ClassVar[bool] = False
+	"""True iff the value depends on the address of the instruction."""
+
 	def from_inst_word(self, instr_word: int, inst: "Instruction", /) -> "Operand":
 		"""Load field word from instruction word."""
 		raise NotImplementedError
 
+	def word_mask(self) -> int:
+		"""Get the mask of the field's bits in the instruction word."""
+		raise NotImplementedError
+
+	def insert(self, instr_word: int, fword: int, /) -> int:
+		"""
+		Replace the field word in an instruction word.
+
+		This is the inverse of ``from_inst_word``, before any conversion of the
+		field word (e.g. a saddr field word is the low byte of the address).
+		"""
+		raise NotImplementedError
+
+	def extract_source(self, word: str, pc_next: str, /) -> str:
+		"""
+		Get Python expression source equivalent to ``from_inst_word``.
+
+		The expression evaluates to the operand value, given the names of the
+		variables holding the instruction word and the sequentially next PC.
+		This is used to generate specialized decoders.
+		"""
+		raise NotImplementedError
+
 	# noinspection PyMethodMayBeStatic
 	def render(self, val: int, inst: "Instruction", /) -> str:
-		"""Render the value based on the type of the field."""
+		"""
+		Render the value based on the type of the field.
+
+		This must not have side effects, the result may be cached.
+		"""
 		# Neutral default.
 		return str(val)
 
+	# noinspection PyMethodMayBeStatic
+	def annotate(self, val: int, inst: "Instruction", /) -> Sequence[str]:
+		"""Get notes about the value, for display alongside the rendering."""
+		return tuple()
+
 
 @dataclass
 class Operand:
@@ -100,11 +374,16 @@ class Flow:
 		"""
 		Get the address(es) of the next instruction(s).
 
-		If guessing a computed address, it would be prudent to add a note to
-		the Instruction object.
+		If guessing a computed address, it would be prudent to explain that
+		in ``annotate``.
 
 		If returning multiple next addresses, it is preferred that if the
 		address of the linearly next instruction is present, that it will be
 		first in the returned sequence.
 		"""
 		raise NotImplementedError
+
+	# noinspection PyMethodMayBeStatic
+	def annotate(self, inst: "Instruction", /) -> Sequence[str]:
+		"""Get notes about the instruction flow."""
+		return tuple()
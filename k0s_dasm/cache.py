@@ -0,0 +1,354 @@
+"""
+Persistent on-disk cache of analysis results.
+
+Entries are keyed by the SHA-256 of the flash image, and a hash of the
+instruction definitions and the analysis sources, so any change to either
+makes a new entry. Each entry is one file: a small JSON header followed by
+the raw array columns of the instruction table, walks, xrefs, resolved jumps
+and control flow graph. Loading one is a few bulk array reads, no decoding.
+
+The cache directory is kept under a size limit, evicting the least recently
+used entries (by file modification time, which is updated on each hit).
+"""
+
+from array import array
+from dataclasses import asdict, fields
+from hashlib import sha256
+import json
+import os
+import struct
+import sys
+import time
+from typing import Any, BinaryIO
+
+from k0s_dasm.analysis import AnalysisResult, AnalysisStats, Analyzer, Walk
+from k0s_dasm.base import Flash, Program
+from k0s_dasm.cfg import ControlFlowGraph
+from k0s_dasm.codegen import DEFAULT_CACHE_DIR, definitions_hash
+from k0s_dasm.defs import DEFAULT_ISA
+from k0s_dasm import instrument
+from k0s_dasm.table import COLUMNS
+from k0s_dasm.xref import XrefIndex
+
+FORMAT_VERSION = 3
+"""Bump when the entry file layout changes."""
+
+DEFAULT_MAX_BYTES = 256 << 20
+"""Default cache size limit, in bytes."""
+
+_MAGIC = b"K0SC"
+_HEADER = struct.Struct("<4sI")
+"""Magic, and length of the JSON header that follows."""
+
+_SOURCES = (
+	"base.py",
+	"flow.py",
+	"table.py",
+	"analysis.py",
+	"vsa.py",
+	"xref.py",
+	"cfg.py",
+	"ibase.py",
+	"registry.py",
+	"defs.py",
+)
+"""Analysis sources the results depend on (besides the definitions)."""
+
+_SUFFIX = ".k0sc"
+
+
+def analysis_hash(isa: str = DEFAULT_ISA) -> str:
+	"""Get the hash of an ISA variant's definitions and the analysis sources."""
+	h = sha256(f"k0s_dasm cache v{FORMAT_VERSION}\n{definitions_hash(isa)}\n".encode())
+	pkgdir = os.path.dirname(__file__)
+	for name in _SOURCES:
+		with open(os.path.join(pkgdir, name), "rb") as f:
+			h.update(f.read())
+	return h.hexdigest()
+
+
+def image_hash(flash: Flash) -> str:
+	"""Get the hash of a flash image."""
+	return sha256(flash).hexdigest()
+
+
+class AnalysisCache:
+	"""Content-addressed cache of analysis results and control flow graphs."""
+
+	def __init__(
+		self, cache_dir: str | None = None, max_bytes: int = DEFAULT_MAX_BYTES
+	) -> None:
+		"""Use a cache directory (by default, a subdirectory of the user's)."""
+		if cache_dir is None:
+			cache_dir = os.path.join(DEFAULT_CACHE_DIR, "analysis")
+		self.cache_dir = cache_dir
+		"""The cache directory."""
+
+		self.max_bytes = max_bytes
+		"""Total size limit of the cache entries."""
+
+		self._analysis_hashes: dict[str, str] = {}
+
+	def key(self, flash: Flash, isa: str = DEFAULT_ISA) -> str:
+		"""Get the cache key for a flash image (decoded as an ISA variant)."""
+		try:
+			definitions = self._analysis_hashes[isa]
+		except KeyError:
+			definitions = self._analysis_hashes[isa] = analysis_hash(isa)
+		text = f"{image_hash(flash)}:{isa}:{definitions}"
+		return sha256(text.encode()).hexdigest()
+
+	def path(self, key: str) -> str:
+		"""Get the entry file path for a key."""
+		return os.path.join(self.cache_dir, key + _SUFFIX)
+
+	def analyze(self, program: Program) -> tuple[AnalysisResult, ControlFlowGraph]:
+		"""
+		Analyze a fresh Program, or load the results if cached.
+
+		The Program's instruction table is filled either way.
+		"""
+		cached = self.load(program)
+		if cached is not None:
+			return cached
+		result = Analyzer(program).run()
+		with instrument.phase("cfg"):
+			cfg = ControlFlowGraph.build(program, indirect=result.jumps)
+		self.store(result, cfg)
+		return result, cfg
+
+	def load(self, program: Program) -> tuple[AnalysisResult, ControlFlowGraph] | None:
+		"""
+		Load cached results into a fresh Program, if there are any.
+
+		Unreadable entries are deleted, and count as misses. The results' wall
+		time is the time taken to load them.
+		"""
+		path = self.path(self.key(program.flash, program.isa))
+		start_time = time.perf_counter()
+		with instrument.phase("cache_load"):
+			try:
+				with open(path, "rb") as f:
+					header, arrays = _read_entry(f)
+			except OSError:
+				instrument.count("cache_misses")
+				return None
+			except ValueError:
+				instrument.count("cache_misses")
+				self._discard(path)
+				return None
+			try:
+				result, cfg = _restore(program, header, arrays)
+			except (KeyError, TypeError, ValueError):
+				instrument.count("cache_misses")
+				self._discard(path)
+				return None
+			instrument.count("cache_hits")
+			try:
+				os.utime(path)
+			except FileNotFoundError:
+				pass  # evicted by someone else meanwhile
+		result.stats.wall_time = time.perf_counter() - start_time
+		return result, cfg
+
+	def _discard(self, path: str) -> None:
+		"""Delete an unusable entry."""
+		try:
+			os.remove(path)
+		except OSError:
+			pass
+
+	def store(self, result: AnalysisResult, cfg: ControlFlowGraph) -> None:
+		"""Store results, then evict old entries over the size limit."""
+		program = result.program
+		key = self.key(program.flash, program.isa)
+		with instrument.phase("cache_store"):
+			header, arrays = _flatten(result, cfg)
+			os.makedirs(self.cache_dir, exist_ok=True)
+			path = self.path(key)
+			tmp_path = f"{path}.{os.getpid()}.tmp"
+			with open(tmp_path, "wb") as f:
+				_write_entry(f, header, arrays)
+			os.replace(tmp_path, path)
+			self.evict(keep=key)
+
+	def entries(self) -> list[tuple[float, int, str]]:
+		"""Get the entries, as (last use, size, path), least recently used first."""
+		out = []
+		try:
+			names = os.listdir(self.cache_dir)
+		except FileNotFoundError:
+			return []
+		for name in names:
+			if not name.endswith(_SUFFIX):
+				continue
+			path = os.path.join(self.cache_dir, name)
+			try:
+				st = os.stat(path)
+			except FileNotFoundError:
+				continue  # evicted by someone else
+			out.append((st.st_mtime, st.st_size, path))
+		out.sort()
+		return out
+
+	def evict(self, keep: str | None = None) -> None:
+		"""Delete least recently used entries until within the size limit."""
+		entries = self.entries()
+		total = sum([size for _, size, _ in entries])
+		for _, size, path in entries:
+			if total <= self.max_bytes:
+				break
+			if keep is not None and path == self.path(keep):
+				continue
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				pass
+			total -= size
+
+
+def _flatten(
+	result: AnalysisResult, cfg: ControlFlowGraph
+) -> tuple[dict[str, Any], dict[str, array]]:
+	"""Get the JSON header and arrays for an entry."""
+	program = result.program
+	table = program.instrs
+	arrays = {f"instrs.{name}": column for name, column in table.columns().items()}
+
+	walk_offsets = array("I", [0])
+	walk_pcs = array("I")
+	for walk in result.walks:
+		walk_pcs.extend(walk.pcs)
+		walk_offsets.append(len(walk_pcs))
+	arrays["walks.starts"] = array("i", [walk.start for walk in result.walks])
+	arrays["walks.bad"] = array(
+		"i", [0 if walk.bad is None else walk.bad for walk in result.walks]
+	)
+	arrays["walks.has_bad"] = array(
+		"B", [walk.bad is not None for walk in result.walks]
+	)
+	arrays["walks.offsets"] = walk_offsets
+	arrays["walks.pcs"] = walk_pcs
+
+	for fdef in fields(XrefIndex):
+		arrays[f"xrefs.{fdef.name}"] = getattr(result.xrefs, fdef.name)
+
+	jump_offsets = array("I", [0])
+	jump_targets = array("I")
+	for targets in result.jumps.values():
+		jump_targets.extend(targets)
+		jump_offsets.append(len(jump_targets))
+	arrays["jumps.pcs"] = array("I", result.jumps)
+	arrays["jumps.offsets"] = jump_offsets
+	arrays["jumps.targets"] = jump_targets
+
+	sites = [(slot, pc) for slot, pcs in program.tables.callt_sites.items() for pc in pcs]
+	arrays["callt.slots"] = array("I", [slot for slot, _ in sites])
+	arrays["callt.sites"] = array("I", [pc for _, pc in sites])
+
+	for fdef in fields(ControlFlowGraph):
+		if fdef.name != "program":
+			arrays[f"cfg.{fdef.name}"] = getattr(cfg, fdef.name)
+
+	header = {
+		"definitions": [cls.__name__ for cls in table.definitions],
+		"stats": asdict(result.stats),
+	}
+	return header, arrays
+
+
+def _restore(
+	program: Program, header: dict[str, Any], arrays: dict[str, array]
+) -> tuple[AnalysisResult, ControlFlowGraph]:
+	"""
+	Restore the results of an entry into a fresh Program.
+
+	Raises KeyError, TypeError or ValueError if the entry doesn't hold what's
+	expected, before changing the Program.
+	"""
+	definitions = [program.registry.by_name(name) for name in header["definitions"]]
+	columns = {name: arrays[f"instrs.{name}"] for name in COLUMNS}
+	stats = AnalysisStats(**header["stats"])
+	walk_starts, walk_bad = arrays["walks.starts"], arrays["walks.bad"]
+	walk_has_bad = arrays["walks.has_bad"]
+	walk_offsets, walk_pcs = arrays["walks.offsets"], arrays["walks.pcs"]
+	jump_pcs, jump_offsets = arrays["jumps.pcs"], arrays["jumps.offsets"]
+	jump_targets = arrays["jumps.targets"]
+	callt_slots, callt_sites = arrays["callt.slots"], arrays["callt.sites"]
+	xrefs = XrefIndex(**{f.name: arrays[f"xrefs.{f.name}"] for f in fields(XrefIndex)})
+	cfg = ControlFlowGraph(
+		program=program,
+		**{
+			f.name: arrays[f"cfg.{f.name}"]
+			for f in fields(ControlFlowGraph)
+			if f.name != "program"
+		},
+	)
+
+	walks = []
+	jumps: dict[int, tuple[int, ...]] = {}
+	try:
+		for idx, (start, bad) in enumerate(zip(walk_starts, walk_bad)):
+			pcs = walk_pcs[walk_offsets[idx] : walk_offsets[idx + 1]].tolist()
+			walks.append(Walk(start=start, pcs=pcs, bad=bad if walk_has_bad[idx] else None))
+		for idx, pc in enumerate(jump_pcs):
+			targets = jump_targets[jump_offsets[idx] : jump_offsets[idx + 1]]
+			jumps[pc] = tuple(targets)
+	except IndexError as e:
+		raise ValueError("Bad walk or jump offsets") from e
+
+	program.instrs.load_columns(definitions, columns)
+
+	for slot, pc in zip(callt_slots, callt_sites):
+		program.tables.callt_sites.setdefault(slot, set()).add(pc)
+
+	result = AnalysisResult(
+		program=program,
+		walks=walks,
+		coverage=program.coverage(),
+		xrefs=xrefs,
+		jumps=jumps,
+		stats=stats,
+	)
+	return result, cfg
+
+
+def _write_entry(f: BinaryIO, header: dict[str, Any], arrays: dict[str, array]) -> None:
+	"""Write an entry file."""
+	header = dict(
+		header,
+		byteorder=sys.byteorder,
+		arrays=[[name, arr.typecode, len(arr)] for name, arr in arrays.items()],
+	)
+	data = json.dumps(header).encode()
+	f.write(_HEADER.pack(_MAGIC, len(data)))
+	f.write(data)
+	for arr in arrays.values():
+		arr.tofile(f)
+
+
+def _read_entry(f: BinaryIO) -> tuple[dict[str, Any], dict[str, array]]:
+	"""Read an entry file, raising ValueError if it's not valid."""
+	try:
+		magic, length = _HEADER.unpack(f.read(_HEADER.size))
+	except struct.error as e:
+		raise ValueError("Truncated cache entry") from e
+	if magic != _MAGIC:
+		raise ValueError("Not a cache entry")
+	header = json.loads(f.read(length))
+	try:
+		layout = [(str(n), str(t), int(c)) for n, t, c in header["arrays"]]
+		swap = header["byteorder"] != sys.byteorder
+	except (KeyError, TypeError) as e:
+		raise ValueError("Bad cache entry header") from e
+	arrays = {}
+	for name, typecode, count in layout:
+		arr = array(typecode)
+		try:
+			arr.fromfile(f, count)
+		except EOFError as e:
+			raise ValueError("Truncated cache entry") from e
+		if swap:
+			arr.byteswap()
+		arrays[name] = arr
+	return header, arrays
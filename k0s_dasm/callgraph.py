@@ -0,0 +1,218 @@
+"""Function discovery and call graph."""
+
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Sequence
+
+from k0s_dasm.cfg import EDGE_CALL, NO_BLOCK, ControlFlowGraph
+
+NO_FUNCTION = -1
+"""Function index for blocks that don't belong to any function."""
+
+
+@dataclass(frozen=True)
+class CallGraph:
+	"""
+	Functions recovered from a control flow graph, and the calls between them.
+
+	Functions start at the program's entry points (vector and call tables) and
+	at call targets. A function's extent is the blocks reachable from its entry
+	without following calls, up to returns (and other exits without a known
+	target). Branching into another function's entry doesn't extend the
+	function; it is taken as a tail call, and recorded as a call. Branching
+	back to the function's own entry is just a loop.
+
+	Blocks can belong to more than one function (shared tails); ``owners``
+	only holds the first (lowest entry address). Functions are numbered in
+	entry address order. Block and call lists are in CSR form, as in
+	``ControlFlowGraph``.
+	"""
+
+	cfg: ControlFlowGraph
+	"""The control flow graph the functions were found in."""
+
+	entries: array
+	"""Entry block index of each function."""
+
+	block_offsets: array
+	"""Offsets into ``blocks`` for each function (plus one at the end)."""
+
+	blocks: array
+	"""Block indexes of each function, sorted."""
+
+	owners: array
+	"""First function each block belongs to, or ``NO_FUNCTION``."""
+
+	callee_offsets: array
+	"""Offsets into ``callees`` for each function (plus one at the end)."""
+
+	callees: array
+	"""Called function indexes, sorted and distinct per function."""
+
+	reach: Sequence[int]
+	"""
+	Transitive callees of each function, as bitsets of function indexes.
+
+	A function only reaches itself if it is (mutually) recursive.
+	"""
+
+	@classmethod
+	def build(
+		cls, cfg: ControlFlowGraph, entry_points: Iterable[int] | None = None
+	) -> "CallGraph":
+		"""Find the functions in a control flow graph (by default, the program's)."""
+		if entry_points is None:
+			entry_points = cfg.program.entry_points()
+		entry_blocks = {cfg.block_at(pc) for pc in entry_points}
+		for idx, kind in enumerate(cfg.succ_kinds):
+			if kind == EDGE_CALL:
+				entry_blocks.add(cfg.succ_blocks[idx])
+		entry_blocks.discard(NO_BLOCK)
+		entries = array("i", sorted(entry_blocks))
+
+		block_offsets = array("I", [0])
+		blocks = array("i")
+		owners = array("i", [NO_FUNCTION]) * len(cfg)
+		callee_offsets = array("I", [0])
+		callees = array("i")
+		for func, entry in enumerate(entries):
+			extent, called = _walk_function(cfg, entry, entry_blocks)
+			for blk in extent:
+				if owners[blk] == NO_FUNCTION:
+					owners[blk] = func
+			blocks.extend(extent)
+			block_offsets.append(len(blocks))
+			callees.extend([bisect_left(entries, blk) for blk in called])
+			callee_offsets.append(len(callees))
+
+		return cls(
+			cfg=cfg,
+			entries=entries,
+			block_offsets=block_offsets,
+			blocks=blocks,
+			owners=owners,
+			callee_offsets=callee_offsets,
+			callees=callees,
+			reach=_closure(len(entries), callee_offsets, callees),
+		)
+
+	def __len__(self) -> int:
+		"""Get the number of functions."""
+		return len(self.entries)
+
+	def function_at(self, addr: int) -> int:
+		"""Get the index of the function with an entry address, or ``NO_FUNCTION``."""
+		blk = self.cfg.block_at(addr)
+		func = bisect_left(self.entries, blk)
+		if blk == NO_BLOCK or func == len(self.entries) or self.entries[func] != blk:
+			return NO_FUNCTION
+		return func
+
+	def entry_addr(self, func: int) -> int:
+		"""Get the entry address of a function."""
+		addr: int = self.cfg.starts[self.entries[func]]
+		return addr
+
+	def function_blocks(self, func: int) -> Sequence[int]:
+		"""Get the block indexes of a function."""
+		return self.blocks[self.block_offsets[func] : self.block_offsets[func + 1]]
+
+	def function_callees(self, func: int) -> Sequence[int]:
+		"""Get the indexes of the functions a function calls directly."""
+		return self.callees[self.callee_offsets[func] : self.callee_offsets[func + 1]]
+
+	def reaches(self, caller: int, callee: int) -> bool:
+		"""Check if a function (transitively) calls another."""
+		return bool((self.reach[caller] >> callee) & 1)
+
+	def reachable(self, func: int) -> Iterator[int]:
+		"""Get the indexes of all functions a function (transitively) calls."""
+		bits = self.reach[func]
+		while bits:
+			low = bits & -bits
+			yield low.bit_length() - 1
+			bits ^= low
+
+
+def _walk_function(
+	cfg: ControlFlowGraph, entry: int, entry_blocks: set[int]
+) -> tuple[list[int], list[int]]:
+	"""Get the (sorted) blocks of a function, and its (sorted) called entries."""
+	seen = {entry}
+	called: set[int] = set()
+	stack = [entry]
+	while stack:
+		blk = stack.pop()
+		for idx in range(cfg.succ_offsets[blk], cfg.succ_offsets[blk + 1]):
+			dst = cfg.succ_blocks[idx]
+			if dst == NO_BLOCK:
+				continue
+			if cfg.succ_kinds[idx] == EDGE_CALL or (dst in entry_blocks and dst != entry):
+				called.add(dst)
+			elif dst not in seen:
+				seen.add(dst)
+				stack.append(dst)
+	return sorted(seen), sorted(called)
+
+
+def _closure(
+	count: int, callee_offsets: Sequence[int], callees: Sequence[int]
+) -> list[int]:
+	"""
+	Get the transitive closure of the call graph, as bitsets per function.
+
+	Strongly connected components are found (iterative Tarjan) in reverse
+	topological order, so each one's callees are complete when it is reached
+	and a component's bitset is just the union of its callees'.
+	"""
+	reach = [0] * count
+	index = [-1] * count
+	low = [0] * count
+	on_stack = [False] * count
+	scc_stack: list[int] = []
+	counter = 0
+	for root in range(count):
+		if index[root] != -1:
+			continue
+		work = [(root, callee_offsets[root])]
+		index[root] = low[root] = counter
+		counter += 1
+		scc_stack.append(root)
+		on_stack[root] = True
+		while work:
+			func, pos = work[-1]
+			if pos < callee_offsets[func + 1]:
+				work[-1] = (func, pos + 1)
+				callee = callees[pos]
+				if index[callee] == -1:
+					index[callee] = low[callee] = counter
+					counter += 1
+					scc_stack.append(callee)
+					on_stack[callee] = True
+					work.append((callee, callee_offsets[callee]))
+				elif on_stack[callee]:
+					low[func] = min(low[func], index[callee])
+				continue
+
+			work.pop()
+			if work:
+				parent = work[-1][0]
+				low[parent] = min(low[parent], low[func])
+			if low[func] != index[func]:
+				continue
+			members = []
+			while True:
+				member = scc_stack.pop()
+				on_stack[member] = False
+				members.append(member)
+				if member == func:
+					break
+			bits = 0
+			for member in members:
+				for pos in range(callee_offsets[member], callee_offsets[member + 1]):
+					callee = callees[pos]
+					bits |= (1 << callee) | reach[callee]
+			for member in members:
+				reach[member] = bits
+	return reach
@@ -0,0 +1,271 @@
+"""Basic blocks and control flow graph."""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Mapping, Sequence
+
+from k0s_dasm.base import Program
+from k0s_dasm.flow import CallReturn, ComputedCallT
+from k0s_dasm.table import NO_NEXT, NO_ROW
+
+NO_BLOCK = -1
+"""Successor block index for targets that aren't decoded instructions."""
+
+EDGE_FALL = 0
+"""Edge kind: falling through to the sequentially next instruction."""
+
+EDGE_BRANCH = 1
+"""Edge kind: (un)conditional branch."""
+
+EDGE_CALL = 2
+"""Edge kind: call (including via the call table)."""
+
+
+@dataclass(frozen=True)
+class Edge:
+	"""A control flow edge, as given by ``ControlFlowGraph.edges``."""
+
+	src: int
+	"""Source block index."""
+
+	dst: int
+	"""Destination block index, or ``NO_BLOCK``."""
+
+	addr: int
+	"""Destination address."""
+
+	kind: int
+	"""One of the EDGE_* values."""
+
+
+@dataclass(frozen=True)
+class ControlFlowGraph:
+	"""
+	Basic blocks of the decoded instructions, with edges in CSR form.
+
+	A block is a run of instructions where each falls through to the next and
+	only the first is a branch target (or entry point). Blocks end after any
+	instruction that doesn't simply fall through, i.e. branches, calls and
+	returns. Blocks are numbered in address order.
+
+	Successor edges of block ``b`` are at ``succ_offsets[b]`` up to (excluding)
+	``succ_offsets[b + 1]`` in the ``succ_*`` arrays, likewise predecessors.
+	All edges leave from the last instruction of the block.
+	"""
+
+	program: Program
+	"""The program the graph was built from."""
+
+	instr_pcs: array
+	"""Addresses of all instructions, sorted."""
+
+	block_instrs: array
+	"""Offsets into ``instr_pcs`` of the first instruction of each block."""
+
+	starts: array
+	"""Start address of each block."""
+
+	ends: array
+	"""End address (exclusive) of each block."""
+
+	succ_offsets: array
+	"""Offsets into the ``succ_*`` arrays for each block (plus one at the end)."""
+
+	succ_blocks: array
+	"""Successor block indexes, or ``NO_BLOCK``."""
+
+	succ_addrs: array
+	"""Successor addresses."""
+
+	succ_kinds: array
+	"""Successor edge kinds, as EDGE_* values."""
+
+	pred_offsets: array
+	"""Offsets into ``pred_blocks`` for each block (plus one at the end)."""
+
+	pred_blocks: array
+	"""Predecessor block indexes."""
+
+	@classmethod
+	def build(
+		cls,
+		program: Program,
+		entry_points: Iterable[int] | None = None,
+		indirect: Mapping[int, Sequence[int]] | None = None,
+	) -> "ControlFlowGraph":
+		"""
+		Build the graph from the program's decoded instructions.
+
+		Entry points (by default, the program's) always start a block. The
+		instructions are read from the table columns, without materializing.
+
+		Targets of computed branches, which the instruction flows don't give,
+		can be added as ``indirect`` branch targets by instruction address.
+		"""
+		if entry_points is None:
+			entry_points = program.entry_points()
+		if indirect is None:
+			indirect = {}
+		pcs = array("I", sorted(program.instrs))
+		leaders = _find_leaders(program, pcs, entry_points, indirect)
+
+		block_instrs = array("I")
+		starts = array("I")
+		for idx, pc in enumerate(pcs):
+			if leaders[pc]:
+				block_instrs.append(idx)
+				starts.append(pc)
+		block_instrs.append(len(pcs))
+
+		ends, succ_offsets, succ_blocks, succ_addrs, succ_kinds = _find_edges(
+			program, pcs, block_instrs, starts, indirect
+		)
+		pred_offsets, pred_blocks = _invert_edges(len(starts), succ_offsets, succ_blocks)
+
+		return cls(
+			program=program,
+			instr_pcs=pcs,
+			block_instrs=block_instrs,
+			starts=starts,
+			ends=ends,
+			succ_offsets=succ_offsets,
+			succ_blocks=succ_blocks,
+			succ_addrs=succ_addrs,
+			succ_kinds=succ_kinds,
+			pred_offsets=pred_offsets,
+			pred_blocks=pred_blocks,
+		)
+
+	def __len__(self) -> int:
+		"""Get the number of blocks."""
+		return len(self.starts)
+
+	def block_at(self, addr: int) -> int:
+		"""Get the index of the block starting at an address, or ``NO_BLOCK``."""
+		blk = bisect_left(self.starts, addr)
+		if blk == len(self.starts) or self.starts[blk] != addr:
+			return NO_BLOCK
+		return blk
+
+	def block_containing(self, addr: int) -> int:
+		"""Get the index of the block an address belongs to, or ``NO_BLOCK``."""
+		blk = bisect_right(self.starts, addr) - 1
+		if blk < 0 or addr >= self.ends[blk]:
+			return NO_BLOCK
+		return blk
+
+	def instructions(self, blk: int) -> Sequence[int]:
+		"""Get the instruction addresses of a block."""
+		return self.instr_pcs[self.block_instrs[blk] : self.block_instrs[blk + 1]]
+
+	def successors(self, blk: int) -> Sequence[int]:
+		"""Get the successor block indexes of a block (may include ``NO_BLOCK``)."""
+		return self.succ_blocks[self.succ_offsets[blk] : self.succ_offsets[blk + 1]]
+
+	def predecessors(self, blk: int) -> Sequence[int]:
+		"""Get the predecessor block indexes of a block."""
+		return self.pred_blocks[self.pred_offsets[blk] : self.pred_offsets[blk + 1]]
+
+	def edges(self, blk: int) -> Iterator[Edge]:
+		"""Get the successor edges of a block."""
+		for idx in range(self.succ_offsets[blk], self.succ_offsets[blk + 1]):
+			yield Edge(
+				src=blk,
+				dst=self.succ_blocks[idx],
+				addr=self.succ_addrs[idx],
+				kind=self.succ_kinds[idx],
+			)
+
+
+def _find_leaders(
+	program: Program,
+	pcs: Sequence[int],
+	entry_points: Iterable[int],
+	indirect: Mapping[int, Sequence[int]],
+) -> bytearray:
+	"""Flag the addresses where blocks start, in one pass over instructions."""
+	table = program.instrs
+	rows = table.rows
+	leaders = bytearray(len(program.flash))
+	for pc in entry_points:
+		if pc in table:
+			leaders[pc] = 1
+	for targets in indirect.values():
+		for pc in targets:
+			if pc in table:
+				leaders[pc] = 1
+	plain_end = -1
+	for pc in pcs:
+		row = rows[pc]
+		if pc != plain_end:
+			leaders[pc] = 1
+		end = pc + table.lengths[row]
+		next0 = table.next0[row]
+		next1 = table.next1[row]
+		plain_end = end if next0 == end and next1 == NO_NEXT else -1
+		for target in (next0, next1):
+			if target != end and table.row(target) != NO_ROW:
+				leaders[target] = 1
+	return leaders
+
+
+def _find_edges(
+	program: Program,
+	pcs: Sequence[int],
+	block_instrs: Sequence[int],
+	starts: array,
+	indirect: Mapping[int, Sequence[int]],
+) -> tuple[array, array, array, array, array]:
+	"""Get block ends and successor edges, from each block's last instruction."""
+	table = program.instrs
+	is_call = [isinstance(d.flow, (CallReturn, ComputedCallT)) for d in table.definitions]
+	ends = array("I")
+	succ_offsets = array("I", [0])
+	succ_blocks = array("i")
+	succ_addrs = array("i")
+	succ_kinds = array("B")
+	for blk in range(len(starts)):
+		pc = pcs[block_instrs[blk + 1] - 1]
+		row = table.rows[pc]
+		end = pc + table.lengths[row]
+		ends.append(end)
+		targets = [table.next0[row], table.next1[row], *indirect.get(pc, ())]
+		for target in targets:
+			if target == NO_NEXT:
+				continue
+			if target == end:
+				kind = EDGE_FALL
+			elif is_call[table.class_ids[row]]:
+				kind = EDGE_CALL
+			else:
+				kind = EDGE_BRANCH
+			dst = bisect_left(starts, target)
+			if dst == len(starts) or starts[dst] != target:
+				dst = NO_BLOCK
+			succ_blocks.append(dst)
+			succ_addrs.append(target)
+			succ_kinds.append(kind)
+		succ_offsets.append(len(succ_blocks))
+	return ends, succ_offsets, succ_blocks, succ_addrs, succ_kinds
+
+
+def _invert_edges(
+	count: int, succ_offsets: Sequence[int], succ_blocks: Sequence[int]
+) -> tuple[array, array]:
+	"""Get predecessor edges in CSR form, by counting sort of the successors."""
+	counts = array("I", [0]) * (count + 1)
+	for dst in succ_blocks:
+		if dst != NO_BLOCK:
+			counts[dst + 1] += 1
+	for blk in range(count):
+		counts[blk + 1] += counts[blk]
+	pred_offsets = array("I", counts)
+	pred_blocks = array("i", [NO_BLOCK]) * counts[-1]
+	for src in range(count):
+		for idx in range(succ_offsets[src], succ_offsets[src + 1]):
+			dst = succ_blocks[idx]
+			if dst != NO_BLOCK:
+				pred_blocks[counts[dst]] = src
+				counts[dst] += 1
+	return pred_offsets, pred_blocks
@@ -0,0 +1,267 @@
+"""Command line interface."""
+
+import argparse
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+import json
+import os
+import sys
+import time
+from typing import Any, Sequence, TextIO
+
+from k0s_dasm.analysis import Analyzer
+from k0s_dasm.base import Program
+from k0s_dasm.cache import AnalysisCache, image_hash
+from k0s_dasm.decode_profile import DEFAULT_PROFILE, DecodeProfile
+from k0s_dasm.ibase import Instruction
+from k0s_dasm import instrument
+
+_worker_cache: AnalysisCache | None = None
+"""Analysis cache used by this worker process, if any."""
+
+_worker_stats = False
+"""Whether this worker process collects instrumentation statistics."""
+
+
+def _init_worker(
+	cache_dir: str | None,
+	codegen: bool,
+	stats: bool = False,
+	profile: str | None = None,
+	validate: bool = False,
+) -> None:
+	"""Set up a worker process: build the decoder once, open the cache."""
+	global _worker_cache, _worker_stats
+	if codegen:
+		from k0s_dasm import codegen as _codegen
+
+		_codegen.install()
+	else:
+		Instruction.decode_tree()
+	if profile is not None:
+		DecodeProfile.load(profile).apply()
+	Instruction.set_validation(validate)
+	if cache_dir is not None:
+		_worker_cache = AnalysisCache(cache_dir)
+	_worker_stats = stats
+
+
+def analyze_image(path: str) -> dict[str, Any]:
+	"""
+	Analyze one image file, giving a JSON-compatible summary.
+
+	If the worker collects statistics, they're under ``"stats"``.
+	"""
+	start = time.perf_counter()
+	stats = instrument.enable() if _worker_stats else None
+	try:
+		with instrument.phase("load"):
+			prog = Program.from_file(path)
+		if _worker_cache is not None:
+			result, _ = _worker_cache.analyze(prog)
+		else:
+			result = Analyzer(prog).run()
+	except Exception as e:
+		return {"path": path, "error": f"{type(e).__name__}: {e}"}
+	summary = {
+		"path": path,
+		"sha256": image_hash(prog.flash),
+		"size": len(prog.flash),
+		"instructions": len(prog.instrs),
+		"bad": result.stats.bad,
+		"walks": len(result.walks),
+		"code_bytes": result.coverage.code_bytes,
+		"overlaps": result.coverage.overlaps,
+		"jumps_resolved": result.stats.jumps_resolved,
+		"jumps_unresolved": result.stats.jumps_unresolved,
+		"time": time.perf_counter() - start,
+	}
+	if stats is not None:
+		summary["stats"] = stats.to_dict()
+	return summary
+
+
+def find_images(root: str, suffixes: Sequence[str]) -> list[str]:
+	"""Find image files under a directory, sorted."""
+	out = []
+	for dirpath, _, names in os.walk(root):
+		for name in names:
+			if name.lower().endswith(tuple(suffixes)):
+				out.append(os.path.join(dirpath, name))
+	out.sort()
+	return out
+
+
+def _progress(stream: TextIO, done: int, total: int, start: float) -> None:
+	"""Update the progress meter."""
+	rate = done / max(time.perf_counter() - start, 1e-9)
+	stream.write(f"\r[{done}/{total}] {rate:.1f} images/s")
+	stream.flush()
+
+
+def batch(args: argparse.Namespace) -> int:
+	"""Run the ``batch`` command."""
+	paths = find_images(args.dir, args.suffix or [".bin"])
+	progress = sys.stderr.isatty() if args.progress is None else args.progress
+
+	start = time.perf_counter()
+	done = failures = bad = 0
+	stats = instrument.Stats()
+	with ExitStack() as stack:
+		out: TextIO = sys.stdout
+		if args.output != "-":
+			out = stack.enter_context(open(args.output, "w"))
+		with ProcessPoolExecutor(
+			max_workers=args.jobs,
+			initializer=_init_worker,
+			initargs=(args.cache, args.codegen, args.stats, args.profile, args.validate),
+		) as executor:
+			futures: list[Future[dict[str, Any]]] = [
+				executor.submit(analyze_image, path) for path in paths
+			]
+			for future in as_completed(futures):
+				summary = future.result()
+				if "stats" in summary:
+					stats.merge(instrument.Stats.from_dict(summary.pop("stats")))
+				done += 1
+				if "error" in summary:
+					failures += 1
+				else:
+					bad += summary["bad"]
+				if not args.quiet:
+					out.write(json.dumps(summary) + "\n")
+				if progress:
+					_progress(sys.stderr, done, len(paths), start)
+
+	elapsed = time.perf_counter() - start
+	if progress:
+		sys.stderr.write("\n")
+	sys.stderr.write(
+		f"{done} images in {elapsed:.2f}s ({done / max(elapsed, 1e-9):.1f} images/s), "
+		f"{failures} failures, {bad} bad instructions\n"
+	)
+	if args.stats:
+		sys.stderr.write("\n".join(stats.report()) + "\n")
+	return 1 if failures else 0
+
+
+def _profile_image(path: str) -> tuple[DecodeProfile, str | None]:
+	"""
+	Record the decode profile of one image file.
+
+	If it fails, the profile is empty, and the error is given.
+	"""
+	out = DecodeProfile()
+	try:
+		out.record_file(path)
+	except Exception as e:
+		return out, f"{type(e).__name__}: {e}"
+	return out, None
+
+
+def profile(args: argparse.Namespace) -> int:
+	"""Run the ``profile`` command."""
+	paths = find_images(args.dir, args.suffix or [".bin"])
+	out = DecodeProfile()
+	failures = 0
+	with ProcessPoolExecutor(
+		max_workers=args.jobs,
+		initializer=_init_worker,
+		initargs=(None, args.codegen),
+	) as executor:
+		results = executor.map(_profile_image, paths, chunksize=4)
+		for path, (image_profile, error) in zip(paths, results):
+			if error is not None:
+				failures += 1
+				sys.stderr.write(f"{path}: {error}\n")
+			out.merge(image_profile)
+	out.save(args.output)
+	sys.stderr.write(out.report() + "\n")
+	sys.stderr.write(f"Wrote {args.output}\n")
+	if failures:
+		sys.stderr.write(f"{failures} of {len(paths)} images failed\n")
+	return 1 if failures else 0
+
+
+def check(args: argparse.Namespace) -> int:
+	"""Run the ``check`` command."""
+	from k0s_dasm.ambiguity import check as check_encodings
+
+	report = check_encodings()
+	print(report.report())
+	return 0 if report.ok else 1
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+	"""Run the command line interface."""
+	parser = argparse.ArgumentParser(prog="k0s-dasm", description=__doc__)
+	commands = parser.add_subparsers(dest="command", required=True)
+
+	common = argparse.ArgumentParser(add_help=False)
+	common.add_argument("dir", help="directory to search for images")
+	common.add_argument(
+		"-j", "--jobs", type=int, default=None, help="worker processes (default: CPUs)"
+	)
+	common.add_argument(
+		"--codegen", action="store_true", help="use the generated decoder module"
+	)
+	common.add_argument(
+		"--suffix",
+		action="append",
+		default=None,
+		help="image file name suffix (default: .bin), may be repeated",
+	)
+
+	cmd = commands.add_parser(
+		"batch", parents=[common], help="analyze a directory of images"
+	)
+	cmd.add_argument(
+		"-o", "--output", default="-", help="NDJSON output file (default: stdout)"
+	)
+	cmd.add_argument(
+		"-q", "--quiet", action="store_true", help="no NDJSON output, only the summary"
+	)
+	cmd.add_argument("--cache", default=None, help="analysis cache directory to use")
+	cmd.add_argument(
+		"--profile", default=None, help="decode profile to order candidates by"
+	)
+	cmd.add_argument(
+		"--validate",
+		action="store_true",
+		help="try all decode candidates, failing on multiple matches",
+	)
+	cmd.add_argument(
+		"--progress",
+		action=argparse.BooleanOptionalAction,
+		default=None,
+		help="show a progress meter (default: if stderr is a terminal)",
+	)
+	cmd.add_argument(
+		"--stats",
+		action="store_true",
+		help="collect instrumentation counters and timers, and report them",
+	)
+	cmd.set_defaults(func=batch)
+
+	cmd = commands.add_parser(
+		"profile",
+		parents=[common],
+		help="record a decode profile from a directory of images",
+	)
+	cmd.add_argument(
+		"-o", "--output", default=DEFAULT_PROFILE, help="profile file to write"
+	)
+	cmd.set_defaults(func=profile)
+
+	cmd = commands.add_parser(
+		"check", help="check the instruction encodings for overlaps (needs NumPy)"
+	)
+	cmd.set_defaults(func=check)
+
+	args = parser.parse_args(argv)
+	code: int = args.func(args)
+	return code
+
+
+if __name__ == "__main__":
+	sys.exit(main())
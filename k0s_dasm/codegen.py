@@ -0,0 +1,125 @@
+"""
+Ahead-of-time generated decoder module, with an on-disk cache.
+
+The generated module is flat Python: one specialized decode function per
+instruction definition (as per ``decode.decoder_source``), and the compiled
+decision tree as literal dispatch tables. There is one per ISA variant,
+cached by a hash of the variant name and the sources the definitions and
+generator are built from, and only regenerated when those change, so that
+short runs don't need to compile the decision tree or decoders again.
+
+Build it ahead of time with ``python -m k0s_dasm.codegen [cache_dir]``.
+"""
+
+from hashlib import sha256
+import importlib.util
+import os
+import sys
+from types import ModuleType
+from typing import Sequence, Type
+
+from k0s_dasm.decode import DecodeTree, decoder_source
+from k0s_dasm.defs import DEFAULT_ISA
+from k0s_dasm.ibase import Instruction
+from k0s_dasm.registry import ISA_MODULES, registry
+
+GENERATOR_VERSION = 2
+"""Bump when the generated module layout changes."""
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "k0s_dasm")
+
+_SOURCES = (
+	"base.py",
+	"defs.py",
+	"flow.py",
+	"field.py",
+	"ibase.py",
+	"registry.py",
+	"decode.py",
+	"codegen.py",
+)
+"""
+Package sources the generated module depends on, besides the ISA variant's
+definition modules (``registry.ISA_MODULES``).
+"""
+
+
+def definitions_hash(isa: str = DEFAULT_ISA) -> str:
+	"""Get the hash of the instruction definition sources of an ISA variant."""
+	h = sha256(f"k0s_dasm codegen v{GENERATOR_VERSION}\n{isa}\n".encode())
+	pkgdir = os.path.dirname(__file__)
+	paths = [os.path.join(pkgdir, name) for name in _SOURCES]
+	for module in ISA_MODULES.get(isa, ()):
+		spec = importlib.util.find_spec(module)
+		if spec is None or spec.origin is None:
+			raise ImportError(f"Can't find {isa} definition module: {module}")
+		paths.append(spec.origin)
+	for path in paths:
+		with open(path, "rb") as f:
+			h.update(f.read())
+	return h.hexdigest()
+
+
+def generate(
+	insts: Sequence[Type[Instruction]], tree: DecodeTree, source_hash: str
+) -> str:
+	"""Generate the decoder module source."""
+	parts = [
+		'"""Generated by k0s_dasm.codegen, do not edit."""',
+		f'SOURCE_HASH = "{source_hash}"',
+	]
+	parts.extend([decoder_source(inst) for inst in insts])
+	parts.append(
+		"DECODERS = {\n"
+		+ "".join([f'\t"{inst.__name__}": {inst.__name__},\n' for inst in insts])
+		+ "}"
+	)
+	parts.append(f"ROOTS = {tree.tables()!r}")
+	return "\n\n\n".join(parts) + "\n"
+
+
+def load_decoder(cache_dir: str | None = None, isa: str = DEFAULT_ISA) -> ModuleType:
+	"""Import an ISA variant's generated decoder module, (re)generating it if stale."""
+	# N.B.: avoiding pathlib etc. here, as their imports cost more than the
+	# decision tree compilation this is meant to save.
+	cache_dir = cache_dir if cache_dir is not None else DEFAULT_CACHE_DIR
+	source_hash = definitions_hash(isa)
+	path = os.path.join(cache_dir, f"decoder_{source_hash[:16]}.py")
+
+	if not os.path.exists(path):
+		import py_compile
+
+		reg = registry(isa)
+		source = generate(reg.definitions, reg.decode_tree(), source_hash)
+		os.makedirs(cache_dir, exist_ok=True)
+		tmp_path = f"{path}.{os.getpid()}.tmp"
+		with open(tmp_path, "w") as f:
+			f.write(source)
+		os.replace(tmp_path, path)
+		# compile now, the point is to not pay for that on every run
+		py_compile.compile(path, doraise=True)
+
+	spec = importlib.util.spec_from_file_location(
+		f"k0s_dasm._decoder_{source_hash[:16]}", path
+	)
+	if spec is None or spec.loader is None:
+		raise ImportError(f"Can't load generated decoder: {path}")
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	if module.SOURCE_HASH != source_hash:
+		raise ImportError(f"Generated decoder is stale: {path}")
+	return module
+
+
+def install(cache_dir: str | None = None, isa: str = DEFAULT_ISA) -> None:
+	"""Use the generated decoder for an ISA variant from now on."""
+	module = load_decoder(cache_dir, isa)
+	insts = Instruction.definitions(isa)
+	Instruction.install_decoder(
+		DecodeTree.from_tables(module.ROOTS, insts), module.DECODERS, isa
+	)
+
+
+if __name__ == "__main__":
+	cache_arg = sys.argv[1] if len(sys.argv) > 1 else None
+	print(load_decoder(cache_arg).__file__)
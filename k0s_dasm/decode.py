@@ -0,0 +1,331 @@
+"""Instruction decode indexing."""
+
+from dataclasses import dataclass
+import struct
+from typing import TYPE_CHECKING, Any, Callable, Mapping, Sequence, Type
+
+from k0s_dasm.base import Flash
+from k0s_dasm.defs import PREFIX_BYTE
+
+if TYPE_CHECKING:
+	from k0s_dasm.ibase import Instruction
+	from k0s_dasm.registry import DefinitionInfo
+
+
+_Candidates = tuple[Type["Instruction"], ...]
+
+Decoder = Callable[[int, int], tuple[int, ...] | None]
+"""Specialized decoder: (word, pc) -> operand values, or None if no match."""
+
+
+def _info(cls: Type["Instruction"]) -> "DefinitionInfo":
+	"""Get the registry metadata of a definition."""
+	# circular import
+	from k0s_dasm.registry import registry
+
+	return registry(cls.isa).info(cls)
+
+
+def opcode_byte(cls: Type["Instruction"], idx: int) -> tuple[int, int]:
+	"""Get the (mask, match) pair for one byte of an instruction encoding."""
+	shift = 8 * (cls.bytecount - 1 - idx)
+	return (cls.mmask >> shift) & 0xFF, (cls.match >> shift) & 0xFF
+
+
+def decoder_source(inst: Type["Instruction"]) -> str:
+	"""
+	Generate a specialized decoder function for one instruction definition.
+
+	The function checks the encoding (including excluded encodings) and
+	extracts all operand values, with the masks and shifts inlined.
+	"""
+	digits = 2 * inst.bytecount
+
+	def hexlit(val: int) -> str:
+		return f"0x{val:0{digits}X}"
+
+	info = _info(inst)
+	values = info.extract
+	lines = [
+		f"def {inst.__name__}(word: int, pc: int) -> tuple[int, ...] | None:",
+		f'\t"""{inst.mnemonic}."""',
+		f"\tif word & {hexlit(info.mmask)} != {hexlit(info.match)}:",
+		"\t\treturn None",
+	]
+	shift = 8 * (WINDOW_BYTES - inst.bytecount)
+	for ex_mask, ex_match in info.excludes:
+		# window-aligned, the decoder has the bare word
+		lines.append(
+			f"\tif word & {hexlit(ex_mask >> shift)} == {hexlit(ex_match >> shift)}:"
+		)
+		lines.append("\t\treturn None")
+	if any("pc_next" in value for value in values):
+		lines.append(f"\tpc_next = pc + {inst.bytecount}")
+	trailing = "," if len(values) == 1 else ""
+	lines.append(f"\treturn ({', '.join(values)}{trailing})")
+	return "\n".join(lines)
+
+
+def compile_decoder(inst: Type["Instruction"]) -> Decoder:
+	"""Compile the specialized decoder function for an instruction definition."""
+	namespace: dict[str, Any] = {}
+	exec(decoder_source(inst), namespace)
+	decoder: Decoder = namespace[inst.__name__]
+	return decoder
+
+
+def _byte_values(mask: int, match: int) -> Sequence[int]:
+	"""Get all byte values that satisfy a masked byte pattern."""
+	return [b for b in range(0x100) if (b & mask) == (match & mask)]
+
+
+@dataclass(frozen=True)
+class DecodeIndex:
+	"""
+	Candidate instruction definitions, by leading opcode byte(s).
+
+	Candidates are kept in definition order, so that decoding via the index
+	tries (a subset of) the same classes in the same order as a linear scan.
+	"""
+
+	first: tuple[_Candidates, ...]
+	"""Candidates for each value of the first opcode byte (256 entries)."""
+
+	prefixed: tuple[_Candidates, ...]
+	"""Candidates for each value of the second byte after ``PREFIX_BYTE``."""
+
+	@classmethod
+	def build(cls, insts: Sequence[Type["Instruction"]]) -> "DecodeIndex":
+		"""Build the index from concrete instruction definitions."""
+		first: list[list[Type[Instruction]]] = [[] for _ in range(0x100)]
+		prefixed: list[list[Type[Instruction]]] = [[] for _ in range(0x100)]
+		for inst in insts:
+			for b in _byte_values(*opcode_byte(inst, 0)):
+				first[b].append(inst)
+			if PREFIX_BYTE not in _byte_values(*opcode_byte(inst, 0)):
+				continue
+			if inst.bytecount < 2:
+				# can't discriminate on a byte it doesn't have
+				for b in range(0x100):
+					prefixed[b].append(inst)
+			else:
+				for b in _byte_values(*opcode_byte(inst, 1)):
+					prefixed[b].append(inst)
+		return cls(
+			first=tuple(tuple(c) for c in first),
+			prefixed=tuple(tuple(c) for c in prefixed),
+		)
+
+	def candidates(self, flash: Flash, pc: int) -> Sequence[Type["Instruction"]]:
+		"""Get the instruction definitions that might match at an address."""
+		if not 0 <= pc < len(flash):
+			return ()
+		b0 = flash[pc]
+		if b0 == PREFIX_BYTE and pc + 1 < len(flash):
+			return self.prefixed[flash[pc + 1]]
+		return self.first[b0]
+
+
+WINDOW_BYTES = 4
+"""Bytes of program data examined by the decision tree (longest instruction)."""
+
+_WINDOW = struct.Struct(">I")
+
+
+def read_window(flash: Flash, pc: int) -> tuple[int, int]:
+	"""
+	Read the big-endian decode window at an address, without copying.
+
+	Returns the window and the number of bytes actually available, which is
+	less than ``WINDOW_BYTES`` at the end of the flash (zero-padded).
+	"""
+	if pc + WINDOW_BYTES <= len(flash):
+		return _WINDOW.unpack_from(flash, pc)[0], WINDOW_BYTES
+	data = flash[pc : pc + WINDOW_BYTES]
+	return int.from_bytes(data, "big") << (8 * (WINDOW_BYTES - len(data))), len(data)
+
+
+def window_pattern(cls: Type["Instruction"]) -> tuple[int, int]:
+	"""Get the (mask, match) pair aligned to the top of the decode window."""
+	info = _info(cls)
+	return info.window_mask, info.window_match
+
+
+@dataclass(frozen=True)
+class _BitTest:
+	"""Decision tree node testing a single bit of the decode window."""
+
+	bit: int
+	zero: "_Node"
+	one: "_Node"
+
+
+_Node = _BitTest | _Candidates
+
+
+def _split_bit(insts: _Candidates, tested: int) -> int | None:
+	"""
+	Choose the window bit that best separates some instruction definitions.
+
+	Greedy: minimizes the larger side of the split, then the total number of
+	definitions (those that don't care about the bit end up on both sides).
+	"""
+	patterns = [window_pattern(inst) for inst in insts]
+	best: tuple[int, int] | None = None
+	best_bit: int | None = None
+	for bit in reversed(range(8 * WINDOW_BYTES)):
+		if tested & (1 << bit):
+			continue
+		ones = zeros = 0
+		for mask, match in patterns:
+			if mask & (1 << bit):
+				if match & (1 << bit):
+					ones += 1
+				else:
+					zeros += 1
+		dont = len(patterns) - ones - zeros
+		if ones + zeros == 0 or ones == len(patterns) or zeros == len(patterns):
+			continue  # doesn't separate anything
+		score = (max(ones, zeros) + dont, ones + zeros + 2 * dont)
+		if best is None or score < best:
+			best = score
+			best_bit = bit
+	return best_bit
+
+
+def _build_node(insts: _Candidates, tested: int) -> _Node:
+	"""Recursively build a decision (sub)tree for some candidates."""
+	bit = _split_bit(insts, tested)
+	if bit is None:
+		return insts
+
+	zero: list[Type[Instruction]] = []
+	one: list[Type[Instruction]] = []
+	for inst in insts:
+		mask, match = window_pattern(inst)
+		if not mask & (1 << bit) or not match & (1 << bit):
+			zero.append(inst)
+		if not mask & (1 << bit) or match & (1 << bit):
+			one.append(inst)
+	tested |= 1 << bit
+	return _BitTest(
+		bit=bit,
+		zero=_build_node(tuple(zero), tested),
+		one=_build_node(tuple(one), tested),
+	)
+
+
+@dataclass(frozen=True)
+class DecodeTree:
+	"""
+	Bit-test decision tree decoder, compiled from instruction definitions.
+
+	The root is a switch on the first opcode byte (per ``DecodeIndex``), under
+	which single window bits are tested until no tested bit can separate the
+	remaining candidates. Leaves normally hold one definition; leaves with more
+	are encodings where the masks overlap, and only field checks can tell the
+	definitions apart. These are listed in ``ambiguous`` when the tree is built.
+	"""
+
+	roots: tuple[_Node, ...]
+	"""Subtree for each value of the first opcode byte (256 entries)."""
+
+	ambiguous: tuple[_Candidates, ...]
+	"""Distinct leaves with more than one candidate definition."""
+
+	depth: int
+	"""Maximum number of bit tests below the first byte switch."""
+
+	@classmethod
+	def build(cls, index: DecodeIndex) -> "DecodeTree":
+		"""Compile the tree from the first-byte index buckets."""
+		roots = tuple(_build_node(bucket, 0xFF << 24) for bucket in index.first)
+		return cls._from_roots(roots)
+
+	@classmethod
+	def from_tables(
+		cls, tables: Sequence[Any], insts: Sequence[Type["Instruction"]]
+	) -> "DecodeTree":
+		"""
+		Rebuild a compiled tree from the plain form given by ``tables``.
+
+		Definitions are looked up by class name.
+		"""
+		by_name = {inst.__name__: inst for inst in insts}
+
+		def node(table: Any) -> _Node:
+			if len(table) and isinstance(table[0], int):
+				return _BitTest(bit=table[0], zero=node(table[1]), one=node(table[2]))
+			return tuple(by_name[name] for name in table)
+
+		return cls._from_roots(tuple(node(table) for table in tables))
+
+	@classmethod
+	def _from_roots(cls, roots: tuple[_Node, ...]) -> "DecodeTree":
+		"""Create from compiled subtrees, finding depth and ambiguous leaves."""
+		ambiguous: list[_Candidates] = []
+		depth = 0
+		stack: list[tuple[_Node, int]] = [(root, 0) for root in roots]
+		while stack:
+			node, level = stack.pop()
+			if isinstance(node, _BitTest):
+				stack.append((node.zero, level + 1))
+				stack.append((node.one, level + 1))
+				continue
+			depth = max(depth, level)
+			if len(node) > 1 and node not in ambiguous:
+				ambiguous.append(node)
+		return cls(roots=roots, ambiguous=tuple(ambiguous), depth=depth)
+
+	def candidates(self, flash: Flash, pc: int) -> Sequence[Type["Instruction"]]:
+		"""Get the instruction definitions that might match at an address."""
+		if not 0 <= pc < len(flash):
+			return ()
+		return self.find(read_window(flash, pc)[0])
+
+	def find(self, window: int) -> Sequence[Type["Instruction"]]:
+		"""Get the instruction definitions that might match a decode window."""
+		node = self.roots[window >> (8 * WINDOW_BYTES - 8)]
+		while type(node) is _BitTest:
+			node = node.one if (window >> node.bit) & 1 else node.zero
+		return node  # type: ignore[return-value]
+
+	def reordered(self, hits: Mapping[str, int]) -> "DecodeTree":
+		"""
+		Get a copy with each leaf's candidates in descending order of hits.
+
+		Hits are by definition class name, as recorded by ``DecodeProfile``. Ties
+		keep their current order.
+		"""
+
+		def node(sub: _Node) -> _Node:
+			if isinstance(sub, _BitTest):
+				return _BitTest(bit=sub.bit, zero=node(sub.zero), one=node(sub.one))
+			return tuple(sorted(sub, key=lambda inst: -hits.get(inst.__name__, 0)))
+
+		return self._from_roots(tuple(node(root) for root in self.roots))
+
+	def tables(self) -> tuple[Any, ...]:
+		"""
+		Get the tree in a plain form, suitable for writing as a literal.
+
+		Bit tests are ``(bit, zero, one)`` tuples, and leaves are tuples of
+		definition class names.
+		"""
+
+		def table(node: _Node) -> Any:
+			if isinstance(node, _BitTest):
+				return node.bit, table(node.zero), table(node.one)
+			return tuple(inst.__name__ for inst in node)
+
+		return tuple(table(root) for root in self.roots)
+
+	def report(self) -> str:
+		"""Describe the tree and its ambiguous leaves."""
+		lines = [
+			f"Decode tree: max depth {self.depth} below first byte, "
+			f"{len(self.ambiguous)} ambiguous leaves"
+		]
+		for leaf in self.ambiguous:
+			lines.append("\t" + " | ".join([inst.mnemonic for inst in leaf]))
+		return "\n".join(lines)
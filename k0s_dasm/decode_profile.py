@@ -0,0 +1,120 @@
+"""
+Profile-guided decode candidate ordering.
+
+A profile is a histogram of decoded instructions by definition, recorded
+from analysis of a training corpus. Applying it reorders the candidates in
+each decode tree leaf so the most common definition is tried first; since
+``autoload`` takes the first match (outside validation mode), the common case
+then matches on the first test.
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+import json
+import os
+from typing import Iterable
+
+from k0s_dasm.analysis import Analyzer
+from k0s_dasm.base import Program
+from k0s_dasm.codegen import DEFAULT_CACHE_DIR
+from k0s_dasm.decode import DecodeTree
+from k0s_dasm.defs import DEFAULT_ISA
+from k0s_dasm.ibase import Instruction
+from k0s_dasm.registry import registry
+
+FORMAT_VERSION = 1
+"""Bump when the profile file layout changes."""
+
+DEFAULT_PROFILE = os.path.join(DEFAULT_CACHE_DIR, "profile.json")
+"""Default profile path."""
+
+
+@dataclass
+class DecodeProfile:
+	"""Decoded instruction counts by definition class name, for an ISA variant."""
+
+	hits: Counter[str] = field(default_factory=Counter)
+	"""Instructions decoded, by definition class name."""
+
+	images: int = 0
+	"""Number of images recorded."""
+
+	isa: str = DEFAULT_ISA
+	"""ISA variant the images are decoded as."""
+
+	def record(self, program: Program) -> None:
+		"""Add the instructions in an (analyzed) Program of the same ISA variant."""
+		if program.isa != self.isa:
+			raise ValueError(f"Can't record a {program.isa} program in a {self.isa} profile")
+		for cls, count in program.instrs.class_counts().items():
+			self.hits[cls.__name__] += count
+		self.images += 1
+
+	def record_file(self, path: str) -> None:
+		"""Analyze an image file and add its instructions."""
+		program = Program.from_file(path, isa=self.isa)
+		Analyzer(program).run()
+		self.record(program)
+
+	def merge(self, other: "DecodeProfile") -> None:
+		"""Add another profile (of the same ISA variant) into this one."""
+		if other.isa != self.isa:
+			raise ValueError(f"Can't merge a {other.isa} profile into a {self.isa} one")
+		self.hits.update(other.hits)
+		self.images += other.images
+
+	@classmethod
+	def train(cls, paths: Iterable[str], isa: str = DEFAULT_ISA) -> "DecodeProfile":
+		"""Record a profile from image files (of an ISA variant)."""
+		out = cls(isa=isa)
+		for path in paths:
+			out.record_file(path)
+		return out
+
+	def save(self, path: str = DEFAULT_PROFILE) -> None:
+		"""Write the profile as JSON."""
+		os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+		with open(path, "w") as f:
+			json.dump(
+				{
+					"version": FORMAT_VERSION,
+					"isa": self.isa,
+					"images": self.images,
+					"hits": dict(self.hits.most_common()),
+				},
+				f,
+				indent="\t",
+			)
+
+	@classmethod
+	def load(cls, path: str = DEFAULT_PROFILE) -> "DecodeProfile":
+		"""Read a profile written by ``save``."""
+		with open(path) as f:
+			data = json.load(f)
+		if data.get("version") != FORMAT_VERSION:
+			raise ValueError(f"Unsupported profile version: {data.get('version')}")
+		return cls(
+			hits=Counter(data["hits"]),
+			images=data["images"],
+			isa=data.get("isa", DEFAULT_ISA),
+		)
+
+	def tree(self) -> DecodeTree:
+		"""Get the ISA variant's current decode tree, reordered by this profile."""
+		return registry(self.isa).decode_tree().reordered(self.hits)
+
+	def apply(self) -> None:
+		"""
+		Use the reordered decode tree for all further ``autoload`` calls.
+
+		Apply after installing any other decoder (e.g. ``codegen.install``).
+		"""
+		Instruction.install_tree(self.tree(), self.isa)
+
+	def report(self, top: int = 20) -> str:
+		"""Describe the most common definitions."""
+		total = sum(self.hits.values())
+		lines = [f"Decode profile: {total} instructions from {self.images} images"]
+		for name, count in self.hits.most_common(top):
+			lines.append(f"\t{name:<20} {count:10} ({count / total:.1%})")
+		return "\n".join(lines)
@@ -38,6 +38,12 @@ SP_MAGIC_ADDR = 0xFF1C
 PSW_MAGIC_SADDR = 0x1E
 PSW_MAGIC_ADDR = 0xFF1E
 
+PREFIX_BYTE = 0x0A
+"""First opcode byte shared by the large group of extended instructions."""
+
+DEFAULT_ISA = "78K0S"
+"""ISA variant name of the standard instruction definitions."""
+
 UPD78F9202_VECT: dict[int, str] = {
 	0x00: "Reset",
 	0x02: "Unused1",
@@ -0,0 +1,253 @@
+"""SQLite export of analysis results."""
+
+import sqlite3
+import time
+from typing import Any, Iterable, Sequence
+
+from k0s_dasm.analysis import AnalysisResult
+from k0s_dasm.cache import image_hash
+from k0s_dasm.callgraph import CallGraph
+from k0s_dasm.instrument import phase
+from k0s_dasm.listing import label_names
+from k0s_dasm.xref import access_kinds
+
+BATCH_ROWS = 10000
+"""Rows per ``executemany`` call."""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+	id INTEGER PRIMARY KEY,
+	name TEXT NOT NULL,
+	sha256 TEXT NOT NULL,
+	size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS instructions (
+	image_id INTEGER NOT NULL REFERENCES images(id),
+	pc INTEGER NOT NULL,
+	length INTEGER NOT NULL,
+	word INTEGER NOT NULL,
+	definition TEXT NOT NULL,
+	mnemonic TEXT NOT NULL,
+	text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS operands (
+	image_id INTEGER NOT NULL REFERENCES images(id),
+	pc INTEGER NOT NULL,
+	idx INTEGER NOT NULL,
+	field TEXT NOT NULL,
+	val INTEGER NOT NULL,
+	text TEXT NOT NULL,
+	kind INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS xrefs (
+	image_id INTEGER NOT NULL REFERENCES images(id),
+	addr INTEGER NOT NULL,
+	pc INTEGER NOT NULL,
+	kind INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS functions (
+	image_id INTEGER NOT NULL REFERENCES images(id),
+	entry INTEGER NOT NULL,
+	blocks INTEGER NOT NULL,
+	size INTEGER NOT NULL,
+	callees INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS labels (
+	image_id INTEGER NOT NULL REFERENCES images(id),
+	addr INTEGER NOT NULL,
+	name TEXT NOT NULL,
+	comment TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS instructions_pc ON instructions(image_id, pc);
+CREATE INDEX IF NOT EXISTS instructions_mnemonic ON instructions(mnemonic);
+CREATE INDEX IF NOT EXISTS operands_pc ON operands(image_id, pc);
+CREATE INDEX IF NOT EXISTS operands_val ON operands(val);
+CREATE INDEX IF NOT EXISTS operands_text ON operands(text);
+CREATE INDEX IF NOT EXISTS xrefs_addr ON xrefs(addr);
+CREATE INDEX IF NOT EXISTS xrefs_pc ON xrefs(image_id, pc);
+CREATE INDEX IF NOT EXISTS functions_entry ON functions(image_id, entry);
+CREATE INDEX IF NOT EXISTS labels_addr ON labels(image_id, addr);
+CREATE INDEX IF NOT EXISTS labels_name ON labels(name);
+"""
+"""Database schema. Addresses are absolute, operand kinds are XREF_* flags."""
+
+QUERIES: dict[str, str] = {
+	"operand_writes": """
+		SELECT images.name, operands.pc, instructions.text
+		FROM operands
+		JOIN images ON images.id = operands.image_id
+		JOIN instructions
+			ON instructions.image_id = operands.image_id
+			AND instructions.pc = operands.pc
+		WHERE operands.text = ? AND operands.kind & 2
+		ORDER BY images.name, operands.pc
+	""",
+	"refs_to": """
+		SELECT images.name, xrefs.pc, xrefs.kind
+		FROM xrefs JOIN images ON images.id = xrefs.image_id
+		WHERE xrefs.addr = ?
+		ORDER BY images.name, xrefs.pc
+	""",
+	"mnemonic_counts": """
+		SELECT mnemonic, COUNT(*) AS count
+		FROM instructions
+		GROUP BY mnemonic
+		ORDER BY count DESC
+	""",
+	"images_using": """
+		SELECT images.name, COUNT(*)
+		FROM instructions JOIN images ON images.id = instructions.image_id
+		WHERE instructions.mnemonic = ?
+		GROUP BY images.id
+		ORDER BY images.name
+	""",
+	"largest_functions": """
+		SELECT images.name, functions.entry, functions.size, functions.blocks
+		FROM functions JOIN images ON images.id = functions.image_id
+		ORDER BY functions.size DESC
+		LIMIT ?
+	""",
+}
+"""
+Canned queries, by name.
+
+- ``operand_writes``: writes to an operand by rendered text (e.g. ``"FLCMD"``)
+- ``refs_to``: all xrefs to an absolute address
+- ``mnemonic_counts``: instruction counts by mnemonic, over all images
+- ``images_using``: images using a mnemonic (e.g. ``"BR AX"``), with counts
+- ``largest_functions``: the N largest functions, by byte size
+"""
+
+
+def connect(path: str) -> sqlite3.Connection:
+	"""Open an export database, creating the schema if needed."""
+	conn = sqlite3.connect(path)
+	conn.executescript(SCHEMA)
+	return conn
+
+
+def _batched(
+	conn: sqlite3.Connection, sql: str, rows: Iterable[Sequence[Any]]
+) -> None:
+	"""Insert rows in batches."""
+	batch: list[Sequence[Any]] = []
+	for row in rows:
+		batch.append(row)
+		if len(batch) >= BATCH_ROWS:
+			conn.executemany(sql, batch)
+			batch.clear()
+	if batch:
+		conn.executemany(sql, batch)
+
+
+def export(
+	conn: sqlite3.Connection,
+	result: AnalysisResult,
+	name: str,
+	callgraph: CallGraph | None = None,
+) -> int:
+	"""
+	Export analysis results (and optionally functions) as a new image.
+
+	Everything is inserted in a single transaction. Returns the image ID.
+	"""
+	prog = result.program
+	with phase("export"), conn:
+		cur = conn.execute(
+			"INSERT INTO images (name, sha256, size) VALUES (?, ?, ?)",
+			(name, image_hash(prog.flash), len(prog.flash)),
+		)
+		image_id = cur.lastrowid
+		assert image_id is not None
+
+		pcs = sorted(prog.instrs)
+		_batched(
+			conn,
+			"INSERT INTO instructions VALUES (?, ?, ?, ?, ?, ?, ?)",
+			_instruction_rows(result, image_id, pcs),
+		)
+		_batched(
+			conn,
+			"INSERT INTO operands VALUES (?, ?, ?, ?, ?, ?, ?)",
+			_operand_rows(result, image_id, pcs),
+		)
+		_batched(
+			conn,
+			"INSERT INTO xrefs VALUES (?, ?, ?, ?)",
+			((image_id, x.addr, x.pc, x.kind) for x in result.xrefs),
+		)
+		_batched(
+			conn,
+			"INSERT INTO labels VALUES (?, ?, ?, ?)",
+			(
+				(image_id, addr, label, comment)
+				for addr, (label, comment) in sorted(label_names(result).items())
+			),
+		)
+		if callgraph is not None:
+			_batched(
+				conn,
+				"INSERT INTO functions VALUES (?, ?, ?, ?, ?)",
+				_function_rows(callgraph, image_id),
+			)
+	return image_id
+
+
+def _instruction_rows(
+	result: AnalysisResult, image_id: int, pcs: Sequence[int]
+) -> Iterable[Sequence[Any]]:
+	"""Generate rows for the instructions table."""
+	for pc in pcs:
+		inst = result.program.instrs[pc]
+		yield (
+			image_id,
+			pc,
+			inst.bytecount,
+			inst.word,
+			type(inst).__name__,
+			inst.mnemonic,
+			inst.render(),
+		)
+
+
+def _operand_rows(
+	result: AnalysisResult, image_id: int, pcs: Sequence[int]
+) -> Iterable[Sequence[Any]]:
+	"""Generate rows for the operands table."""
+	for pc in pcs:
+		inst = result.program.instrs[pc]
+		kinds = access_kinds(type(inst))
+		for idx, operand in enumerate(inst.operands.values()):
+			yield (
+				image_id,
+				pc,
+				idx,
+				type(operand.fdef).__name__,
+				operand.val,
+				operand.render(),
+				kinds[idx],
+			)
+
+
+def _function_rows(callgraph: CallGraph, image_id: int) -> Iterable[Sequence[Any]]:
+	"""Generate rows for the functions table."""
+	cfg = callgraph.cfg
+	for func in range(len(callgraph)):
+		blocks = callgraph.function_blocks(func)
+		size = sum([cfg.ends[blk] - cfg.starts[blk] for blk in blocks])
+		yield (
+			image_id,
+			callgraph.entry_addr(func),
+			len(blocks),
+			size,
+			len(callgraph.function_callees(func)),
+		)
+
+
+def query(
+	conn: sqlite3.Connection, name: str, *params: Any
+) -> tuple[list[tuple[Any, ...]], float]:
+	"""Run a canned query, giving the rows and the time taken in seconds."""
+	start = time.perf_counter()
+	rows = conn.execute(QUERIES[name], params).fetchall()
+	return rows, time.perf_counter() - start
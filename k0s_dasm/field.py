@@ -1,7 +1,7 @@
 """Concrete instruction field types."""
 
 from dataclasses import dataclass
-from typing import ClassVar
+from typing import ClassVar, Sequence
 
 from k0s_dasm.base import Field, Operand
 from k0s_dasm.defs import UPD78F9202_SFR
@@ -23,6 +23,20 @@ class _Short(Field):
 		fword = (instr_word >> self.offset) & mask
 		return Operand(fdef=self, inst=inst, val=fword)
 
+	def extract_source(self, word: str, pc_next: str, /) -> str:
+		"""Get expression source for the masked field word."""
+		mask = (2**self.bits) - 1
+		return f"(({word} >> {self.offset}) & 0x{mask:X})"
+
+	def word_mask(self) -> int:
+		"""Get the mask of the field's bits in the instruction word."""
+		return ((1 << self.bits) - 1) << self.offset
+
+	def insert(self, instr_word: int, fword: int, /) -> int:
+		"""Replace the field word in an instruction word."""
+		mask = (1 << self.bits) - 1
+		return (instr_word & ~self.word_mask()) | ((fword & mask) << self.offset)
+
 
 @dataclass(frozen=True)
 class Imm8(_Short):
@@ -53,15 +67,25 @@ class SFR(_Short):
 		operand.val += 0xFF00
 		return operand
 
+	def extract_source(self, word: str, pc_next: str, /) -> str:
+		"""Get expression source for the absolute SFR address."""
+		return f"(0xFF00 + {super().extract_source(word, pc_next)})"
+
 	def render(self, val: int, inst: "Instruction", /) -> str:
 		"""Style SFR address (sfr) operand."""
 		# TODO: not assume which processor
 		if val in UPD78F9202_SFR:
-			inst.notes.append(f"SFR_{val:04X}H -> {UPD78F9202_SFR[val]}")
 			return UPD78F9202_SFR[val]
 		else:
 			return f"SFR_{val:04X}H?"
 
+	def annotate(self, val: int, inst: "Instruction", /) -> Sequence[str]:
+		"""Note the SFR address for known SFR names."""
+		if val in UPD78F9202_SFR:
+			return (f"SFR_{val:04X}H -> {UPD78F9202_SFR[val]}",)
+		else:
+			return tuple()
+
 
 @dataclass(frozen=True)
 class SAddr(_Short):
@@ -84,6 +108,11 @@ class SAddr(_Short):
 			operand.val += 0xFE00
 		return operand
 
+	def extract_source(self, word: str, pc_next: str, /) -> str:
+		"""Get expression source for the absolute short address."""
+		fword = super().extract_source(word, pc_next)
+		return f"({fword} + (0xFF00 if {fword} < 0x20 else 0xFE00))"
+
 	def render(self, val: int, inst: "Instruction", /) -> str:
 		"""Style short address (saddr) operand."""
 		return f"{val:04X}H"
@@ -95,6 +124,7 @@ class JAddrRel(_Short):
 
 	is_addr: ClassVar[bool] = True
 	is_branch: ClassVar[bool] = True
+	is_relative: ClassVar[bool] = True
 
 	bits: ClassVar[int] = 8
 
@@ -108,6 +138,11 @@ class JAddrRel(_Short):
 		operand.val += pc_next
 		return operand
 
+	def extract_source(self, word: str, pc_next: str, /) -> str:
+		"""Get expression source for the absolute branch address."""
+		fword = super().extract_source(word, pc_next)
+		return f"({pc_next} + {fword} - (0x100 if {fword} > 0x80 else 0))"
+
 	def render(self, val: int, inst: "Instruction", /) -> str:
 		"""Style PC-relative address (jdisp) operand."""
 		return f"${val:04X}H"
@@ -127,6 +162,10 @@ class Addr5(_Short):
 		operand.val = 0x40 + (operand.val << 1)
 		return operand
 
+	def extract_source(self, word: str, pc_next: str, /) -> str:
+		"""Get expression source for the call table address."""
+		return f"(0x40 + ({super().extract_source(word, pc_next)} << 1))"
+
 	def render(self, val: int, inst: "Instruction", /) -> str:
 		"""Style CALLT address (addr5) operand."""
 		return f"[{val:02X}H]"
@@ -192,6 +231,24 @@ class _Wide(Field):
 		fword = byte_l | (byte_h << 8)
 		return Operand(fdef=self, inst=inst, val=fword)
 
+	def extract_source(self, word: str, pc_next: str, /) -> str:
+		"""Get expression source for the byte-swapped field word."""
+		offset = self.offset
+		byte_h = f"((({word} >> {offset}) & 0xFF) << 8)"
+		byte_l = f"(({word} >> {offset + 8}) & 0xFF)"
+		return f"({byte_l} | {byte_h})"
+
+	def word_mask(self) -> int:
+		"""Get the mask of the field's bits in the instruction word."""
+		return 0xFFFF << self.offset
+
+	def insert(self, instr_word: int, fword: int, /) -> int:
+		"""Replace the (byte-swapped) field word in an instruction word."""
+		offset = self.offset
+		byte_h = ((fword >> 8) & 0xFF) << offset
+		byte_l = (fword & 0xFF) << (offset + 8)
+		return (instr_word & ~self.word_mask()) | byte_l | byte_h
+
 
 @dataclass(frozen=True)
 class Imm16(_Wide):
@@ -27,7 +27,7 @@ class ConditionalBranch(Flow):
 	def next(self, inst: "Instruction", /) -> Sequence[int]:
 		"""Get forward and branch instruction addresses."""
 		forward = inst.pc + inst.bytecount
-		branch = inst.operands[inst.field_defs[self.branch_field_idx]].val
+		branch = inst.values[self.branch_field_idx]
 		return forward, branch
 
 
@@ -43,7 +43,7 @@ class UnconditionalBranch(Flow):
 
 	def next(self, inst: "Instruction", /) -> Sequence[int]:
 		"""Get branch instruction address."""
-		branch = inst.operands[inst.field_defs[self.branch_field_idx]].val
+		branch = inst.values[self.branch_field_idx]
 		return (branch,)
 
 
@@ -52,16 +52,19 @@ class ComputedUnknown(Flow):
 
 	def next(self, inst: "Instruction", /) -> Sequence[int]:
 		"""Get no addresses (we don't know where to go)."""
-		inst.notes.append("WARNING: Computed branch unknown.")
 		return tuple()
 
+	def annotate(self, inst: "Instruction", /) -> Sequence[str]:
+		"""Warn that the branch target is unknown."""
+		return ("WARNING: Computed branch unknown.",)
+
 
 class Return(ComputedUnknown):
 	"""Return instruction (not sure where to jump back to, but callsite knows)."""
 
-	def next(self, inst: "Instruction", /) -> Sequence[int]:
-		"""Get no addresses (we don't know where to go)."""
-		# inst.notes.append("INFO: Function return.")
+	def annotate(self, inst: "Instruction", /) -> Sequence[str]:
+		"""Get no notes (the callsite knows where to go)."""
+		# return ("INFO: Function return.",)
 		return tuple()
 
 
@@ -74,11 +77,12 @@ class ComputedCallT(Flow):
 	def next(self, inst: "Instruction", /) -> Sequence[int]:
 		"""Get forward address and relevant address from call table."""
 		forward = inst.pc + inst.bytecount
-		callt_idx = inst.operands[inst.field_defs[self.callt_idx_field_idx]].val
-		callt_addr = inst.program.flash_word(callt_idx)
-		inst.notes.append(
-			f"INFO: Initial CALLT[{callt_idx:02X}H] -> !{callt_addr:04X}H"
-		)
-		# N.B.: It's possible the program could change the call table later,
-		# but this would be a major operation as it's in flash.
+		callt_idx = inst.values[self.callt_idx_field_idx]
+		callt_addr = inst.program.tables.callt_target(callt_idx, inst.pc)
 		return forward, callt_addr
+
+	def annotate(self, inst: "Instruction", /) -> Sequence[str]:
+		"""Note the call table entry used."""
+		callt_idx = inst.values[self.callt_idx_field_idx]
+		callt_addr = inst.program.tables.callt_target(callt_idx)
+		return (f"INFO: Initial CALLT[{callt_idx:02X}H] -> !{callt_addr:04X}H",)
@@ -1,17 +1,63 @@
 """Instruction type definitions."""
 
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING, ClassVar, Sequence, Type, TypeVar
-
+from typing import TYPE_CHECKING, Any, ClassVar, Mapping, Sequence, Type, TypeVar
+
+from k0s_dasm.base import Operand
+from k0s_dasm.decode import (
+	WINDOW_BYTES,
+	DecodeIndex,
+	Decoder,
+	DecodeTree,
+	compile_decoder,
+	read_window,
+)
+from k0s_dasm.defs import DEFAULT_ISA
 from k0s_dasm.flow import Forward as FlowForward
+from k0s_dasm.registry import registry
 from k0s_dasm.util import fmthex
 
 if TYPE_CHECKING:
-	from k0s_dasm.base import Field, Flow, Operand, Program
+	from k0s_dasm.base import Field, Flow, Program
 
 
 _T = TypeVar("_T", bound="Instruction")
 
+_validate = False
+
+RENDER_CACHE_SIZE = 1 << 16
+"""Maximum number of rendered instructions kept in the LRU render cache."""
+
+_render_cache: OrderedDict[tuple[type, int, int], str] = OrderedDict()
+
+
+def render_key(inst: "Instruction") -> tuple[type, int, int]:
+	"""Get the render cache key of an instruction."""
+	return (type(inst), inst.word, inst.pc if inst._is_relative else -1)
+
+
+@dataclass(frozen=True)
+class Exclude:
+	"""
+	Encoding excluded from an instruction definition.
+
+	Instruction words that match this pattern are rejected, even though they
+	match the definition's own ``match``/``mmask``. These are generally field
+	values that encode a different instruction (e.g. saddr being PSW).
+	"""
+
+	match: int
+	"""Bits to match (to reject), when masked with mmask."""
+
+	mmask: int
+	"""Mask applied to match and data."""
+
+	@classmethod
+	def of_field(cls, fdef: "Field", fword: int) -> "Exclude":
+		"""Exclude a field word (see ``Field.insert``) of a field."""
+		return cls(match=fdef.insert(0, fword), mmask=fdef.word_mask())
+
 
 @dataclass
 class Instruction:
@@ -60,6 +106,20 @@ class Instruction:
 	rendering that operand, with indices per ``field_defs``.
 	"""
 
+	excludes: ClassVar[Sequence[Exclude]] = tuple()
+	"""
+	Class constant: encodings to reject despite matching.
+
+	These are checked on the raw instruction word, before anything is created.
+	"""
+
+	isa: ClassVar[str] = DEFAULT_ISA
+	"""
+	Class constant: ISA variant the definition belongs to.
+
+	Inherited, or set with a class keyword (``class X(Base, isa="...")``).
+	"""
+
 	word: int
 	"""Raw instruction word (8-32 bits)."""
 
@@ -77,18 +137,48 @@ class Instruction:
 	manual intervention).
 	"""
 
-	operands: dict["Field", "Operand"]
+	values: tuple[int, ...]
 	"""
-	Operand values for each defined Field.
+	Operand values, with indices per ``field_defs``.
 
-	Preferred order is as per ``field_defs``.
+	These are the same as the ``val`` of each of ``operands``, which are only
+	created when needed.
 	"""
 
 	program: "Program"
 	"""The containing Program."""
 
 	notes: list[str] = field(default_factory=list)
-	"""Notes or warnings from analysis."""
+	"""Notes or warnings added by analysis (see also ``annotate``)."""
+
+	_operands: dict["Field", "Operand"] | None = field(
+		default=None, init=False, repr=False, compare=False
+	)
+
+	_decode: ClassVar[Decoder | None] = None
+	"""Class constant: generated decoder, compiled on first use."""
+
+	_is_relative: ClassVar[bool] = False
+	"""
+	Class constant: True iff rendering depends on the instruction address
+	(set when the registry is frozen).
+	"""
+
+	def __init_subclass__(cls, isa: str | None = None, **kwargs: Any) -> None:
+		"""
+		Register concrete definitions with the registry of their ISA variant.
+
+		Concrete definitions are those with ``mnemonic`` and ``match``.
+		Per-definition constants derived from the encoding are reset here, and
+		set from the registry's metadata when it is frozen.
+		"""
+		super().__init_subclass__(**kwargs)
+		if isa is not None:
+			cls.isa = isa
+		cls._decode = None
+		cls._is_relative = False
+		if cls.mnemonic is not NotImplemented and cls.match is not NotImplemented:
+			registry(cls.isa).register(cls)
 
 	@classmethod
 	def load(cls: Type[_T], program: "Program", pc: int) -> _T | None:
@@ -104,28 +194,53 @@ class Instruction:
 
 		if len(data) < cls.bytecount:
 			return None
-		word = int.from_bytes(data[: cls.bytecount], byteorder="big", signed=False)
-		if (word & cls.mmask) != (cls.match & cls.mmask):
+		word = int.from_bytes(data, byteorder="big", signed=False)
+		return cls.from_word(program, pc, word)
+
+	@classmethod
+	def from_word(cls: Type[_T], program: "Program", pc: int, word: int) -> _T | None:
+		"""
+		Attempt to match an instruction word to this instruction def.
+
+		This is the same as ``load``, but with the word already read from the
+		program data.
+		"""
+		decode = cls._decode
+		if decode is None:
+			decode = compile_decoder(cls)
+			cls._decode = staticmethod(decode)
+		values = decode(word, pc)
+		if values is None:
 			return None
 		# else, matched.
 
-		fields: dict[Field, Operand] = {}
 		out = cls(
 			word=word,
 			pc=pc,
 			next=tuple(),
-			operands=fields,
+			values=values,
 			program=program,
 		)
-
-		for fdef in cls.field_defs:
-			fields[fdef] = fdef.from_inst_word(word, out)
 		out.next = out.flow.next(out)
 		if not out._check_fields():
 			return None
 
 		return out
 
+	@property
+	def operands(self) -> dict["Field", "Operand"]:
+		"""
+		Operand values for each defined Field.
+
+		Preferred order is as per ``field_defs``. Created on first access.
+		"""
+		if self._operands is None:
+			self._operands = {
+				fdef: Operand(fdef=fdef, inst=self, val=val)
+				for fdef, val in zip(self.field_defs, self.values)
+			}
+		return self._operands
+
 	# noinspection PyMethodMayBeStatic
 	def _check_fields(self) -> bool:
 		"""
@@ -135,21 +250,74 @@ class Instruction:
 		"""
 		return True
 
+	@staticmethod
+	def definitions(isa: str = DEFAULT_ISA) -> Sequence[Type["Instruction"]]:
+		"""Get all concrete instruction definitions, in definition order."""
+		return registry(isa).definitions
+
+	@staticmethod
+	def decode_index(isa: str = DEFAULT_ISA) -> DecodeIndex:
+		"""Get the first-byte decode index, building it on first use."""
+		return registry(isa).decode_index()
+
+	@staticmethod
+	def decode_tree(isa: str = DEFAULT_ISA) -> DecodeTree:
+		"""Get the decision tree decoder, compiling it on first use."""
+		return registry(isa).decode_tree()
+
+	@staticmethod
+	def install_decoder(
+		tree: DecodeTree, decoders: Mapping[str, Decoder], isa: str = DEFAULT_ISA
+	) -> None:
+		"""
+		Replace the decision tree and per-definition decoders.
+
+		Decoders are looked up by definition class name.
+		"""
+		registry(isa).install_tree(tree)
+		for cls in Instruction.definitions(isa):
+			cls._decode = staticmethod(decoders[cls.__name__])
+
+	@staticmethod
+	def install_tree(tree: DecodeTree, isa: str = DEFAULT_ISA) -> None:
+		"""Replace the decision tree, keeping the per-definition decoders."""
+		registry(isa).install_tree(tree)
+
+	@staticmethod
+	def set_validation(enabled: bool) -> None:
+		"""
+		Enable or disable validation mode for ``autoload``.
+
+		Normally the first candidate (in decode tree leaf order) that matches is
+		taken. In validation mode, all candidates are tried, and more than one
+		matching is an error. ``ambiguity.check`` proves the definitions don't
+		overlap ahead of time, for the whole encoding space.
+		"""
+		global _validate
+		_validate = enabled
+
 	@staticmethod
 	def autoload(program: "Program", pc: int) -> "Instruction":
-		"""Attempt to match some program data to any instruction subclass."""
-		try:
-			# defs live here
-			import k0s_dasm.instr  # noqa
-		except ImportError:
-			pass
+		"""
+		Attempt to match some program data to any instruction subclass.
 
+		Candidates are tried in decode tree leaf order (see ``set_validation``).
+		"""
 		results: list[Instruction] = []
-		for cls in Instruction.__subclasses__():
-			if cls.mnemonic is NotImplemented or cls.match is NotImplemented:
-				continue  # intermediate class
-			result = cls.load(program, pc)
-			if result is not None:
+		if 0 <= pc < len(program.flash):
+			window, avail = read_window(program.flash, pc)
+			candidates = program.registry.decode_tree().find(window)
+		else:
+			window, avail, candidates = 0, 0, ()
+		for cls in candidates:
+			if cls.bytecount > avail:
+				continue
+			word = window >> (8 * (WINDOW_BYTES - cls.bytecount))
+			result = cls.from_word(program, pc, word)
+			if result is not None and (len(candidates) == 1 or not _validate):
+				# unambiguous by encoding, or trusting the definitions not to overlap
+				return result
+			elif result is not None:
 				results.append(result)
 
 		debug_data = program.flash[pc : pc + 4]
@@ -169,8 +337,38 @@ class Instruction:
 			return result
 
 	def render(self) -> str:
-		"""Render instruction mnemonic with field values."""
+		"""
+		Render instruction mnemonic with field values.
+
+		Results are cached by definition and word (and address, for
+		definitions with PC-relative fields).
+		"""
+		key = render_key(self)
+		try:
+			text = _render_cache[key]
+		except KeyError:
+			pass
+		else:
+			_render_cache.move_to_end(key)
+			return text
+
 		ren_fields: list[str] = []
-		for fdef in self.field_defs:
-			ren_fields.append(self.operands[fdef].render())
-		return self.format.format(*ren_fields)
+		for fdef, val in zip(self.field_defs, self.values):
+			ren_fields.append(fdef.render(val, self))
+		text = self.format.format(*ren_fields)
+		_render_cache[key] = text
+		if len(_render_cache) > RENDER_CACHE_SIZE:
+			_render_cache.popitem(last=False)
+		return text
+
+	def annotate(self) -> list[str]:
+		"""
+		Get notes about this instruction, for display alongside the rendering.
+
+		These are from the flow type, then the fields, then ``notes``.
+		"""
+		out = list(self.flow.annotate(self))
+		for fdef, val in zip(self.field_defs, self.values):
+			out.extend(fdef.annotate(val, self))
+		out.extend(self.notes)
+		return out
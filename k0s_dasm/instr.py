@@ -4,7 +4,13 @@ from typing import ClassVar, Sequence
 
 from k0s_dasm import field
 from k0s_dasm.base import Field, Flow
-from k0s_dasm.defs import PSW_MAGIC_ADDR, SP_MAGIC_ADDR, Reg8, Reg16
+from k0s_dasm.defs import (
+	PSW_BIT_IE,
+	PSW_MAGIC_SADDR,
+	SP_MAGIC_SADDR,
+	Reg8,
+	Reg16,
+)
 from k0s_dasm.flow import (
 	CallReturn,
 	ComputedCallT,
@@ -13,7 +19,7 @@ from k0s_dasm.flow import (
 	Return,
 	UnconditionalBranch,
 )
-from k0s_dasm.ibase import Instruction
+from k0s_dasm.ibase import Exclude, Instruction
 
 
 class MOVrbyte(Instruction):
@@ -42,14 +48,10 @@ class MOVsaddrbyte(Instruction):
 		field.Imm8(offset=0),
 	)
 	format: ClassVar[str] = "MOV {0}, {1}"
-
-	def _check_fields(self) -> bool:
-		"""Check that saddr is not PSW."""
-		addr = self.operands[self.field_defs[0]].val
-		if addr == PSW_MAGIC_ADDR:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# saddr is PSW
+		Exclude.of_field(field.SAddr(offset=8), PSW_MAGIC_SADDR),
+	)
 
 
 class MOVsfrbyte(Instruction):
@@ -75,14 +77,10 @@ class MOVAr(Instruction):
 	bytecount: ClassVar[int] = 2
 	field_defs: ClassVar[Sequence["Field"]] = (field.Reg8(offset=1),)
 	format: ClassVar[str] = "MOV A, {0}"
-
-	def _check_fields(self) -> bool:
-		"""Check that r is not A."""
-		r = self.operands[self.field_defs[0]].val
-		if r == Reg8.A:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# r is A
+		Exclude.of_field(field.Reg8(offset=1), Reg8.A),
+	)
 
 
 class MOVrA(Instruction):
@@ -94,14 +92,10 @@ class MOVrA(Instruction):
 	bytecount: ClassVar[int] = 2
 	field_defs: ClassVar[Sequence["Field"]] = (field.Reg8(offset=1),)
 	format: ClassVar[str] = "MOV {0}, A"
-
-	def _check_fields(self) -> bool:
-		"""Check that r is not A."""
-		r = self.operands[self.field_defs[0]].val
-		if r == Reg8.A:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# r is A
+		Exclude.of_field(field.Reg8(offset=1), Reg8.A),
+	)
 
 
 class MOVAsaddr(Instruction):
@@ -113,14 +107,10 @@ class MOVAsaddr(Instruction):
 	bytecount: ClassVar[int] = 2
 	field_defs: ClassVar[Sequence["Field"]] = (field.SAddr(offset=0),)
 	format: ClassVar[str] = "MOV A, {0}"
-
-	def _check_fields(self) -> bool:
-		"""Check that saddr is not PSW."""
-		addr = self.operands[self.field_defs[0]].val
-		if addr == PSW_MAGIC_ADDR:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# saddr is PSW
+		Exclude.of_field(field.SAddr(offset=0), PSW_MAGIC_SADDR),
+	)
 
 
 class MOVsaddrA(Instruction):
@@ -132,14 +122,10 @@ class MOVsaddrA(Instruction):
 	bytecount: ClassVar[int] = 2
 	field_defs: ClassVar[Sequence["Field"]] = (field.SAddr(offset=0),)
 	format: ClassVar[str] = "MOV {0}, A"
-
-	def _check_fields(self) -> bool:
-		"""Check that saddr is not PSW."""
-		addr = self.operands[self.field_defs[0]].val
-		if addr == PSW_MAGIC_ADDR:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# saddr is PSW
+		Exclude.of_field(field.SAddr(offset=0), PSW_MAGIC_SADDR),
+	)
 
 
 class MOVAsfr(Instruction):
@@ -305,14 +291,12 @@ class XCHAr(Instruction):
 	bytecount: ClassVar[int] = 2
 	field_defs: ClassVar[Sequence["Field"]] = (field.Reg8(offset=1),)
 	format: ClassVar[str] = "XCH A, {0}"
-
-	def _check_fields(self) -> bool:
-		"""Check that r is not A or X."""
-		r = self.operands[self.field_defs[0]].val
-		if r == Reg8.A or r == Reg8.X:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# r is A
+		Exclude.of_field(field.Reg8(offset=1), Reg8.A),
+		# r is X
+		Exclude.of_field(field.Reg8(offset=1), Reg8.X),
+	)
 
 
 class XCHAsaddr(Instruction):
@@ -393,14 +377,10 @@ class MOVWAXsaddrp(Instruction):
 	bytecount: ClassVar[int] = 2
 	field_defs: ClassVar[Sequence["Field"]] = (field.SAddr(offset=0),)
 	format: ClassVar[str] = "MOVW AX, {0}"
-
-	def _check_fields(self) -> bool:
-		"""Check that saddrp is not 0b00011100 (which refers to SP)."""
-		addr = self.operands[self.field_defs[0]].val
-		if addr == SP_MAGIC_ADDR:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# saddrp is SP
+		Exclude.of_field(field.SAddr(offset=0), SP_MAGIC_SADDR),
+	)
 
 
 class MOVWsaddrpAX(Instruction):
@@ -412,14 +392,10 @@ class MOVWsaddrpAX(Instruction):
 	bytecount: ClassVar[int] = 2
 	field_defs: ClassVar[Sequence["Field"]] = (field.SAddr(offset=0),)
 	format: ClassVar[str] = "MOVW {0}, AX"
-
-	def _check_fields(self) -> bool:
-		"""Check that saddrp is not 0b00011100 (which refers to SP)."""
-		addr = self.operands[self.field_defs[0]].val
-		if addr == SP_MAGIC_ADDR:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# saddrp is SP
+		Exclude.of_field(field.SAddr(offset=0), SP_MAGIC_SADDR),
+	)
 
 
 class MOVWAXrp(Instruction):
@@ -431,14 +407,10 @@ class MOVWAXrp(Instruction):
 	bytecount: ClassVar[int] = 1
 	field_defs: ClassVar[Sequence["Field"]] = (field.Reg16(offset=2),)
 	format: ClassVar[str] = "MOVW AX, {0}"
-
-	def _check_fields(self) -> bool:
-		"""Check that rp is not AX."""
-		rp = self.operands[self.field_defs[0]].val
-		if rp == Reg16.AX:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# rp is AX
+		Exclude.of_field(field.Reg16(offset=2), Reg16.AX),
+	)
 
 
 class MOVWrpAX(Instruction):
@@ -450,14 +422,10 @@ class MOVWrpAX(Instruction):
 	bytecount: ClassVar[int] = 1
 	field_defs: ClassVar[Sequence["Field"]] = (field.Reg16(offset=2),)
 	format: ClassVar[str] = "MOVW {0}, AX"
-
-	def _check_fields(self) -> bool:
-		"""Check that rp is not AX."""
-		rp = self.operands[self.field_defs[0]].val
-		if rp == Reg16.AX:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# rp is AX
+		Exclude.of_field(field.Reg16(offset=2), Reg16.AX),
+	)
 
 
 class XCHWAXrp(Instruction):
@@ -469,14 +437,10 @@ class XCHWAXrp(Instruction):
 	bytecount: ClassVar[int] = 1
 	field_defs: ClassVar[Sequence["Field"]] = (field.Reg16(offset=2),)
 	format: ClassVar[str] = "XCHW AX, {0}"
-
-	def _check_fields(self) -> bool:
-		"""Check that rp is not AX."""
-		rp = self.operands[self.field_defs[0]].val
-		if rp == Reg16.AX:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# rp is AX
+		Exclude.of_field(field.Reg16(offset=2), Reg16.AX),
+	)
 
 
 class ADDAbyte(Instruction):
@@ -1274,14 +1238,10 @@ class SETsaddrbit(Instruction):
 		field.BitIdx3(offset=12),
 	)
 	format: ClassVar[str] = "SET1 {0}{1}"
-
-	def _check_fields(self) -> bool:
-		"""Check that saddr is not PSW."""
-		addr = self.operands[self.field_defs[0]].val
-		if addr == PSW_MAGIC_ADDR:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# saddr is PSW
+		Exclude.of_field(field.SAddr(offset=0), PSW_MAGIC_SADDR),
+	)
 
 
 class SETsfrbit(Instruction):
@@ -1318,14 +1278,10 @@ class SETPSWbit(Instruction):
 	bytecount: ClassVar[int] = 3
 	field_defs: ClassVar[Sequence["Field"]] = (field.BitIdx3(offset=12),)
 	format: ClassVar[str] = "SET1 PSW{0}"
-
-	def _check_fields(self) -> bool:
-		"""Check that bit is not 7 (IE)."""
-		bit = self.operands[self.field_defs[0]].val
-		if bit == 7:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# bit is IE
+		Exclude.of_field(field.BitIdx3(offset=12), PSW_BIT_IE),
+	)
 
 
 class SETHLbit(Instruction):
@@ -1351,14 +1307,10 @@ class CLRsaddrbit(Instruction):
 		field.BitIdx3(offset=12),
 	)
 	format: ClassVar[str] = "CLR1 {0}{1}"
-
-	def _check_fields(self) -> bool:
-		"""Check that saddr is not PSW."""
-		addr = self.operands[self.field_defs[0]].val
-		if addr == PSW_MAGIC_ADDR:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# saddr is PSW
+		Exclude.of_field(field.SAddr(offset=0), PSW_MAGIC_SADDR),
+	)
 
 
 class CLRsfrbit(Instruction):
@@ -1395,14 +1347,10 @@ class CLRPSWbit(Instruction):
 	bytecount: ClassVar[int] = 3
 	field_defs: ClassVar[Sequence["Field"]] = (field.BitIdx3(offset=12),)
 	format: ClassVar[str] = "CLR1 PSW{0}"
-
-	def _check_fields(self) -> bool:
-		"""Check that bit is not 7 (IE)."""
-		bit = self.operands[self.field_defs[0]].val
-		if bit == 7:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# bit is IE
+		Exclude.of_field(field.BitIdx3(offset=12), PSW_BIT_IE),
+	)
 
 
 class CLRHLbit(Instruction):
@@ -1661,14 +1609,10 @@ class BTsaddrbitReladdr(Instruction):
 	)
 	flow: ClassVar[Flow] = ConditionalBranch(branch_field_idx=2)
 	format: ClassVar[str] = "BT {0}{1}, {2}"
-
-	def _check_fields(self) -> bool:
-		"""Check that saddr is not PSW."""
-		addr = self.operands[self.field_defs[0]].val
-		if addr == PSW_MAGIC_ADDR:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# saddr is PSW
+		Exclude.of_field(field.SAddr(offset=8), PSW_MAGIC_SADDR),
+	)
 
 
 class BTsfrbitReladdr(Instruction):
@@ -1731,14 +1675,10 @@ class BFsaddrbitReladdr(Instruction):
 	)
 	flow: ClassVar[Flow] = ConditionalBranch(branch_field_idx=2)
 	format: ClassVar[str] = "BF {0}{1}, {2}"
-
-	def _check_fields(self) -> bool:
-		"""Check that saddr is not PSW."""
-		addr = self.operands[self.field_defs[0]].val
-		if addr == PSW_MAGIC_ADDR:
-			return False
-		else:
-			return True
+	excludes: ClassVar[Sequence[Exclude]] = (
+		# saddr is PSW
+		Exclude.of_field(field.SAddr(offset=8), PSW_MAGIC_SADDR),
+	)
 
 
 class BFsfrbitReladdr(Instruction):
@@ -0,0 +1,286 @@
+"""
+Opt-in instrumentation counters and phase timers.
+
+Nothing here costs anything until ``enable`` is called: the counters are
+collected by wrappers installed over the hot methods of ``Instruction``
+(``autoload``, ``from_word``, ``render``, ``annotate`` and ``operands``),
+and removed again by ``disable``. Phase timers are context managers around
+coarse steps, which do nothing while disabled.
+
+The per-definition decoders aren't wrapped, so decoders and decode trees can
+be installed (e.g. ``codegen.install``) whether enabled or not.
+"""
+
+from collections import Counter
+from contextlib import nullcontext
+from dataclasses import dataclass, field, fields
+import functools
+import time
+from types import TracebackType
+from typing import TYPE_CHECKING, Any, Callable, ContextManager, Type
+
+from k0s_dasm.ibase import Instruction, render_key
+import k0s_dasm.ibase as ibase
+
+if TYPE_CHECKING:
+	from k0s_dasm.base import Operand, Program
+
+current: "Stats | None" = None
+"""Statistics being collected, if instrumentation is enabled."""
+
+_NULL = nullcontext()
+
+_MISSING = object()
+
+_saved: dict[tuple[type, str], Any] = {}
+"""Original class attributes replaced by wrappers, by (class, name)."""
+
+_in_autoload = False
+"""Whether ``autoload`` is running (so ``from_word`` calls are candidates)."""
+
+
+@dataclass
+class Stats:
+	"""Instrumentation counters and phase timers."""
+
+	autoloads: int = 0
+	"""Calls to ``Instruction.autoload``."""
+
+	tried: Counter[str] = field(default_factory=Counter)
+	"""Candidate definitions tried by ``autoload``, by definition name."""
+
+	matched: Counter[str] = field(default_factory=Counter)
+	"""Candidates that matched in ``autoload``, by definition name."""
+
+	rejected: Counter[str] = field(default_factory=Counter)
+	"""
+	Candidates that matched the encoding mask in ``autoload``, but were
+	rejected by an exclude or ``_check_fields``, by definition name.
+	"""
+
+	materialized: int = 0
+	"""Instructions created outside ``autoload`` (e.g. from a table)."""
+
+	operands: int = 0
+	"""Operand dicts constructed."""
+
+	render_hits: int = 0
+	"""Renders served from the render cache."""
+
+	render_misses: int = 0
+	"""Renders that had to be formatted."""
+
+	notes: int = 0
+	"""Notes emitted by ``annotate``."""
+
+	cache_hits: int = 0
+	"""Analysis cache hits."""
+
+	cache_misses: int = 0
+	"""Analysis cache misses."""
+
+	phases: dict[str, float] = field(default_factory=dict)
+	"""Wall time spent in each phase, in seconds (nested phases overlap)."""
+
+	phase_calls: Counter[str] = field(default_factory=Counter)
+	"""Times each phase was entered."""
+
+	def merge(self, other: "Stats") -> None:
+		"""Add another set of statistics into this one."""
+		for fdef in fields(self):
+			mine, theirs = getattr(self, fdef.name), getattr(other, fdef.name)
+			if isinstance(mine, dict):
+				for key, val in theirs.items():
+					mine[key] = mine.get(key, 0) + val
+			else:
+				setattr(self, fdef.name, mine + theirs)
+
+	def to_dict(self) -> dict[str, Any]:
+		"""Get a JSON-compatible dict of the statistics."""
+		out = {}
+		for fdef in fields(self):
+			val = getattr(self, fdef.name)
+			out[fdef.name] = dict(val) if isinstance(val, dict) else val
+		return out
+
+	@classmethod
+	def from_dict(cls, data: dict[str, Any]) -> "Stats":
+		"""Create statistics from ``to_dict`` output."""
+		out = cls()
+		out.merge(cls(**data))
+		return out
+
+	def report(self, top: int = 10) -> list[str]:
+		"""Get a human-readable report, as lines."""
+		tried = sum(self.tried.values())
+		matched = sum(self.matched.values())
+		rejected = sum(self.rejected.values())
+		per_call = tried / self.autoloads if self.autoloads else 0.0
+		renders = self.render_hits + self.render_misses
+		hit_rate = self.render_hits / renders if renders else 0.0
+		lines = [
+			f"autoload: {self.autoloads} calls, {tried} candidates tried "
+			f"({per_call:.2f}/call), {matched} matched, "
+			f"{rejected} rejected by excludes or _check_fields",
+			f"materialized: {self.materialized} instructions, "
+			f"{self.operands} operand sets",
+			f"render cache: {self.render_hits} hits, {self.render_misses} misses "
+			f"({hit_rate:.1%} hit rate)",
+			f"notes: {self.notes}",
+			f"analysis cache: {self.cache_hits} hits, {self.cache_misses} misses",
+		]
+		if self.phases:
+			lines.append("phases:")
+			for name, secs in sorted(self.phases.items(), key=lambda kv: -kv[1]):
+				calls = self.phase_calls[name]
+				lines.append(f"  {name:<12} {secs:10.4f}s  {calls:8} calls")
+		if self.tried:
+			lines.append(f"top {top} definitions tried:")
+			for name, count in self.tried.most_common(top):
+				lines.append(
+					f"  {name:<16} {count:8} tried  {self.matched[name]:8} matched  "
+					f"{self.rejected[name]:6} rejected"
+				)
+		return lines
+
+
+class _Phase:
+	"""Context manager adding its wall time to a phase."""
+
+	def __init__(self, stats: Stats, name: str) -> None:
+		"""Time a phase into the given statistics."""
+		self.stats = stats
+		self.name = name
+		self.start = 0.0
+
+	def __enter__(self) -> None:
+		"""Start the timer."""
+		self.start = time.perf_counter()
+
+	def __exit__(
+		self,
+		exc_type: Type[BaseException] | None,
+		exc: BaseException | None,
+		tb: TracebackType | None,
+	) -> None:
+		"""Stop the timer."""
+		phases = self.stats.phases
+		phases[self.name] = phases.get(self.name, 0.0) + time.perf_counter() - self.start
+		self.stats.phase_calls[self.name] += 1
+
+
+def phase(name: str) -> ContextManager[None]:
+	"""Time a phase, if instrumentation is enabled."""
+	if current is None:
+		return _NULL
+	return _Phase(current, name)
+
+
+def count(name: str, n: int = 1) -> None:
+	"""Add to a scalar counter, if instrumentation is enabled."""
+	if current is not None:
+		setattr(current, name, getattr(current, name) + n)
+
+
+def _replace(cls: type, name: str, value: Any) -> None:
+	"""Replace a class attribute, saving the original."""
+	_saved.setdefault((cls, name), cls.__dict__.get(name, _MISSING))
+	setattr(cls, name, value)
+
+
+def _install() -> None:
+	"""Install the counting wrappers."""
+	autoload = Instruction.autoload
+	render = Instruction.render
+	annotate = Instruction.annotate
+	operands = Instruction.__dict__["operands"]
+
+	def counted_autoload(program: "Program", pc: int) -> Instruction:
+		global _in_autoload
+		assert current is not None
+		current.autoloads += 1
+		_in_autoload = True
+		start = time.perf_counter()
+		try:
+			return autoload(program, pc)
+		finally:
+			_in_autoload = False
+			elapsed = time.perf_counter() - start
+			current.phases["decode"] = current.phases.get("decode", 0.0) + elapsed
+			current.phase_calls["decode"] += 1
+
+	def counted_render(self: Instruction) -> str:
+		assert current is not None
+		if render_key(self) in ibase._render_cache:
+			current.render_hits += 1
+		else:
+			current.render_misses += 1
+		return render(self)
+
+	def counted_annotate(self: Instruction) -> list[str]:
+		assert current is not None
+		out = annotate(self)
+		current.notes += len(out)
+		return out
+
+	def counted_operands(self: Instruction) -> dict[Any, "Operand"]:
+		assert current is not None
+		if self._operands is None:
+			current.operands += 1
+		out: dict[Any, "Operand"] = operands.fget(self)
+		return out
+
+	from_word = Instruction.from_word.__func__  # type: ignore[attr-defined]
+
+	_replace(Instruction, "autoload", staticmethod(counted_autoload))
+	_replace(Instruction, "from_word", classmethod(_counted_from_word(from_word)))
+	_replace(Instruction, "render", counted_render)
+	_replace(Instruction, "annotate", counted_annotate)
+	_replace(Instruction, "operands", property(counted_operands))
+
+
+def _counted_from_word(
+	from_word: Callable[..., Instruction | None]
+) -> Callable[..., Instruction | None]:
+	"""Wrap ``from_word``, counting candidates tried in ``autoload``."""
+
+	@functools.wraps(from_word)
+	def counted(
+		cls: Type[Instruction], program: "Program", pc: int, word: int
+	) -> Instruction | None:
+		assert current is not None
+		if not _in_autoload:
+			current.materialized += 1
+			return from_word(cls, program, pc, word)
+		name = cls.__name__
+		current.tried[name] += 1
+		out = from_word(cls, program, pc, word)
+		if out is not None:
+			current.matched[name] += 1
+		elif word & cls.mmask == cls.match & cls.mmask:
+			current.rejected[name] += 1
+		return out
+
+	return counted
+
+
+def enable() -> Stats:
+	"""Start collecting statistics (afresh), installing the wrappers if needed."""
+	global current
+	if not _saved:
+		_install()
+	current = Stats()
+	return current
+
+
+def disable() -> Stats | None:
+	"""Stop collecting statistics and remove the wrappers, giving the last ones."""
+	global current
+	for (cls, name), value in _saved.items():
+		if value is _MISSING:
+			delattr(cls, name)
+		else:
+			setattr(cls, name, value)
+	_saved.clear()
+	out, current = current, None
+	return out
@@ -0,0 +1,141 @@
+"""Address-ordered listing output."""
+
+from array import array
+from bisect import bisect_left
+import heapq
+from typing import Iterator, Sequence, TextIO
+
+from k0s_dasm.analysis import AnalysisResult
+from k0s_dasm.instrument import phase
+from k0s_dasm.util import fmthex
+from k0s_dasm.xref import XREF_BRANCH, XREF_CALL
+
+CHUNK_LINES = 4096
+"""Lines buffered before each write to the stream."""
+
+_INSTR = 0
+_BAD = 1
+
+
+def label_names(result: AnalysisResult) -> dict[int, tuple[str, str]]:
+	"""
+	Get labels for an analysis result, as (name, comment) by address.
+
+	Labels are placed at entry points (commented with the vector or call
+	table slot names), branch and call targets, resolved computed jump
+	targets, walk starts, and anything in the Program's ``labels``. Names are
+	from the Program's ``labels`` if there, otherwise generated from the
+	address.
+	"""
+	prog = result.program
+	comments: dict[int, list[str]] = {}
+	for entry in prog.tables.vectors + prog.tables.callt:
+		if entry.word is not None and entry.is_set:
+			comments.setdefault(entry.word, []).append(entry.name)
+	for xref in result.xrefs:
+		if xref.kind & (XREF_BRANCH | XREF_CALL):
+			comments.setdefault(xref.addr, [])
+	for targets in result.jumps.values():
+		for addr in targets:
+			comments.setdefault(addr, [])
+	for walk in result.walks:
+		comments.setdefault(walk.start, [])
+	for addr in prog.labels:
+		comments.setdefault(addr, [])
+
+	return {
+		addr: (prog.labels.get(addr, f"label_{addr:04X}"), ", ".join(names))
+		for addr, names in comments.items()
+	}
+
+
+def _label_lines(label: tuple[str, str]) -> Iterator[str]:
+	"""Generate the lines for a label."""
+	name, comment = label
+	yield ""
+	yield f"{name}:" + (f"  ; {comment}" if comment else "")
+
+
+def _data_lines(
+	start: int,
+	end: int,
+	labels: dict[int, tuple[str, str]],
+	label_addrs: Sequence[int],
+) -> Iterator[str]:
+	"""Generate the lines for a data range, with exclusive end, split at labels."""
+	lo = bisect_left(label_addrs, start)
+	hi = bisect_left(label_addrs, end, lo)
+	for addr in label_addrs[lo:hi]:
+		if addr > start:
+			yield f"; DATA 0x{start:04X}-0x{addr - 1:04X} ({addr - start} bytes)"
+		yield from _label_lines(labels[addr])
+		start = addr
+	yield f"; DATA 0x{start:04X}-0x{end - 1:04X} ({end - start} bytes)"
+
+
+def listing_lines(result: AnalysisResult) -> Iterator[str]:
+	"""
+	Generate the listing lines, in address order.
+
+	Only one instruction is materialized at a time; the rest of the state is
+	the sorted instruction addresses and the labels. Computed branches
+	resolved by the analysis are annotated with their targets.
+	"""
+	prog = result.program
+	flash = prog.flash
+	labels = label_names(result)
+	label_addrs = sorted(labels)
+	pcs = array("I", sorted(prog.instrs))
+	bad = sorted(
+		{
+			walk.bad
+			for walk in result.walks
+			if walk.bad is not None and 0 <= walk.bad < len(flash)
+		}
+		- set(prog.instrs)
+	)
+
+	pos = 0
+	events = heapq.merge(((pc, _INSTR) for pc in pcs), ((pc, _BAD) for pc in bad))
+	for pc, kind in events:
+		if pc > pos:
+			yield from _data_lines(pos, pc, labels, label_addrs)
+		if pc in labels:
+			yield from _label_lines(labels[pc])
+		if kind == _BAD:
+			badword = flash[pc : pc + 4]
+			yield f"; BAD INSTRUCTION AT 0x{pc:04X}: {fmthex(badword)} ..."
+			pos = max(pos, pc + 1)
+			continue
+
+		instr = prog.instrs[pc]
+		word = flash[pc : pc + instr.bytecount]
+		yield f"\t{instr.render():<30};{pc:04X}  {fmthex(word)}"
+		notes = instr.annotate()
+		targets = result.jumps.get(pc)
+		if targets:
+			# replace the flow's notes (an unknown target warning)
+			names = ", ".join([labels[addr][0] for addr in targets])
+			notes[: len(instr.flow.annotate(instr))] = [f"Computed branch to: {names}"]
+		for note in notes:
+			yield f"\t                              ; {note}"
+		pos = max(pos, pc + instr.bytecount)
+	if pos < len(flash):
+		yield from _data_lines(pos, len(flash), labels, label_addrs)
+
+
+def write_listing(
+	result: AnalysisResult, stream: TextIO, chunk_lines: int = CHUNK_LINES
+) -> None:
+	"""Write the listing to a text stream, in chunks of lines."""
+	chunk: list[str] = []
+	with phase("listing"):
+		for line in listing_lines(result):
+			chunk.append(line)
+			if len(chunk) >= chunk_lines:
+				chunk.append("")
+				stream.write("\n".join(chunk))
+				chunk.clear()
+		if chunk:
+			chunk.append("")
+			stream.write("\n".join(chunk))
@@ -0,0 +1,180 @@
+"""
+Instruction definition registry.
+
+Concrete ``Instruction`` subclasses register themselves with the registry
+for their ISA variant when they're created, at any depth of subclassing. A
+registry is frozen the first time its definitions are needed: the ISA's
+definition modules are imported, the definitions are fixed in registration
+order, and per-definition metadata is computed once. Registering another
+definition after that is an error. The decoders, decode trees and render
+cache use the metadata rather than working it out again.
+
+Each registry also holds its own decode index and tree, so several ISA
+variants (e.g. 78K0S derivatives with extra or different instructions) can
+be used side by side.
+"""
+
+from dataclasses import dataclass
+import importlib
+from typing import TYPE_CHECKING, Sequence, Type
+
+from k0s_dasm.decode import WINDOW_BYTES, DecodeIndex, DecodeTree
+from k0s_dasm.defs import DEFAULT_ISA
+
+if TYPE_CHECKING:
+	from k0s_dasm.ibase import Instruction
+
+
+ISA_MODULES: dict[str, tuple[str, ...]] = {DEFAULT_ISA: ("k0s_dasm.instr",)}
+"""Modules to import for each ISA variant's definitions, by ISA name."""
+
+
+@dataclass(frozen=True)
+class DefinitionInfo:
+	"""Precomputed metadata of a registered instruction definition."""
+
+	cls: Type["Instruction"]
+	"""The definition."""
+
+	class_id: int
+	"""Index of the definition in its registry's ``definitions``."""
+
+	mmask: int
+	"""Encoding mask, per the definition."""
+
+	match: int
+	"""Encoding bits (already masked)."""
+
+	window_mask: int
+	"""Encoding mask, aligned to the top of the decode window."""
+
+	window_match: int
+	"""Encoding bits, aligned to the top of the decode window."""
+
+	excludes: tuple[tuple[int, int], ...]
+	"""Excluded encodings as (mask, match), aligned to the decode window."""
+
+	extract: tuple[str, ...]
+	"""
+	Field extractor plan: an expression per field, of the instruction word
+	(``word``) and the sequentially next PC (``pc_next``), giving its value.
+	"""
+
+	relative: bool
+	"""True iff rendering depends on the instruction address."""
+
+	@classmethod
+	def of(cls, inst: Type["Instruction"], class_id: int) -> "DefinitionInfo":
+		"""Compute the metadata of a definition."""
+		shift = 8 * (WINDOW_BYTES - inst.bytecount)
+		match = inst.match & inst.mmask
+		return cls(
+			cls=inst,
+			class_id=class_id,
+			mmask=inst.mmask,
+			match=match,
+			window_mask=inst.mmask << shift,
+			window_match=match << shift,
+			excludes=tuple(
+				(ex.mmask << shift, (ex.match & ex.mmask) << shift)
+				for ex in inst.excludes
+			),
+			extract=tuple(
+				fdef.extract_source("word", "pc_next") for fdef in inst.field_defs
+			),
+			relative=any([fdef.is_relative for fdef in inst.field_defs]),
+		)
+
+
+class Registry:
+	"""Instruction definitions of one ISA variant."""
+
+	def __init__(self, isa: str) -> None:
+		"""Create an empty registry."""
+		self.isa = isa
+		"""ISA variant name."""
+
+		self._pending: list[Type["Instruction"]] = []
+		self._definitions: tuple[Type["Instruction"], ...] | None = None
+		self._info: dict[Type["Instruction"], DefinitionInfo] = {}
+		self._by_name: dict[str, Type["Instruction"]] = {}
+		self._index: DecodeIndex | None = None
+		self._tree: DecodeTree | None = None
+
+	@property
+	def frozen(self) -> bool:
+		"""True iff the definitions are fixed."""
+		return self._definitions is not None
+
+	def register(self, inst: Type["Instruction"]) -> None:
+		"""Add a definition, which must be before the registry is frozen."""
+		if self._definitions is not None:
+			raise RuntimeError(
+				f"Can't register {inst.__name__}: "
+				f"{self.isa} definitions are already in use"
+			)
+		if any([other.__name__ == inst.__name__ for other in self._pending]):
+			raise ValueError(f"Duplicate {self.isa} definition name: {inst.__name__}")
+		self._pending.append(inst)
+
+	def freeze(self) -> tuple[Type["Instruction"], ...]:
+		"""Import the ISA's definition modules and fix the definitions."""
+		if self._definitions is None:
+			for module in ISA_MODULES.get(self.isa, ()):
+				importlib.import_module(module)
+			self._definitions = tuple(self._pending)
+			for class_id, inst in enumerate(self._definitions):
+				info = self._info[inst] = DefinitionInfo.of(inst, class_id)
+				self._by_name[inst.__name__] = inst
+				inst._is_relative = info.relative
+		return self._definitions
+
+	@property
+	def definitions(self) -> tuple[Type["Instruction"], ...]:
+		"""Get the definitions, in registration order (freezing if needed)."""
+		if self._definitions is None:
+			return self.freeze()
+		return self._definitions
+
+	def info(self, inst: Type["Instruction"]) -> DefinitionInfo:
+		"""Get the metadata of a definition."""
+		self.freeze()
+		return self._info[inst]
+
+	def by_name(self, name: str) -> Type["Instruction"]:
+		"""Get a definition by class name."""
+		self.freeze()
+		return self._by_name[name]
+
+	def decode_index(self) -> DecodeIndex:
+		"""Get the first-byte decode index, building it on first use."""
+		if self._index is None:
+			self._index = DecodeIndex.build(self.definitions)
+		return self._index
+
+	def decode_tree(self) -> DecodeTree:
+		"""Get the decision tree decoder, compiling it on first use."""
+		if self._tree is None:
+			self._tree = DecodeTree.build(self.decode_index())
+		return self._tree
+
+	def install_tree(self, tree: DecodeTree) -> None:
+		"""Replace the decision tree."""
+		self._tree = tree
+
+
+_registries: dict[str, Registry] = {}
+
+
+def registry(isa: str = DEFAULT_ISA) -> Registry:
+	"""Get the registry of an ISA variant, creating it if needed."""
+	try:
+		return _registries[isa]
+	except KeyError:
+		_registries[isa] = Registry(isa)
+		return _registries[isa]
+
+
+def definitions(isa: str = DEFAULT_ISA) -> Sequence[Type["Instruction"]]:
+	"""Get the definitions of an ISA variant."""
+	return registry(isa).definitions
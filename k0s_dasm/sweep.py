@@ -0,0 +1,103 @@
+"""
+Vectorized linear sweep decoding (requires NumPy).
+
+This finds what would decode at every byte offset of a program at once, as
+plain arrays, without creating any Instruction objects.
+"""
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Sequence, Type
+
+import numpy as np
+import numpy.typing as npt
+
+from k0s_dasm.decode import WINDOW_BYTES
+from k0s_dasm.ibase import Instruction
+
+if TYPE_CHECKING:
+	from k0s_dasm.base import Program
+
+NO_MATCH = -1
+"""Class ID for offsets where nothing decodes."""
+
+
+@dataclass
+class SweepResult:
+	"""Per-offset linear sweep decode results."""
+
+	definitions: Sequence[Type[Instruction]]
+	"""Instruction definitions, indexed by class ID."""
+
+	class_ids: npt.NDArray[np.int16]
+	"""Class ID of the instruction decoded at each offset, or ``NO_MATCH``."""
+
+	lengths: npt.NDArray[np.uint8]
+	"""Byte count of the instruction decoded at each offset, or 0."""
+
+	conflicts: npt.NDArray[np.bool_]
+	"""
+	True where more than one definition matches.
+
+	``Instruction.autoload`` would raise for these offsets in validation mode
+	(see ``Instruction.set_validation``), and otherwise take whichever
+	matching definition comes first in the decode tree. The class ID is that
+	of the first matching definition here.
+	"""
+
+
+def words(
+	flash: bytes | bytearray | memoryview,
+) -> Sequence[npt.NDArray[np.uint32]]:
+	"""
+	Get big-endian instruction words at every offset.
+
+	Index N-1 holds the N-byte words. Words running off the end of the flash
+	are zero-padded; the caller needs to mask those out.
+	"""
+	data = np.frombuffer(bytes(flash) + b"\0" * 3, dtype=np.uint8).astype(np.uint32)
+	count = len(flash)
+	b0, b1, b2, b3 = [data[i : i + count] for i in range(4)]
+	byte = np.uint32(8)
+	w8 = b0
+	w16 = (w8 << byte) | b1
+	w24 = (w16 << byte) | b2
+	w32 = (w24 << byte) | b3
+	return w8, w16, w24, w32
+
+
+def linear_sweep(program: "Program") -> SweepResult:
+	"""
+	Decode at every byte offset of the program's flash.
+
+	Each definition of the program's ISA variant has its encoding and
+	excludes (from the registry's metadata) applied to the 4-byte decode
+	windows as array operations. Custom ``_check_fields`` rules are not
+	evaluated.
+	"""
+	registry = program.registry
+	definitions = registry.definitions
+	count = len(program.flash)
+	window = words(program.flash)[WINDOW_BYTES - 1]
+	offsets = np.arange(count)
+
+	class_ids = np.full(count, NO_MATCH, dtype=np.int16)
+	lengths = np.zeros(count, dtype=np.uint8)
+	conflicts = np.zeros(count, dtype=np.bool_)
+	for class_id, inst in enumerate(definitions):
+		info = registry.info(inst)
+		hits = (window & np.uint32(info.window_mask)) == np.uint32(info.window_match)
+		for ex_mask, ex_match in info.excludes:
+			hits &= (window & np.uint32(ex_mask)) != np.uint32(ex_match)
+		hits &= offsets <= count - inst.bytecount
+
+		conflicts |= hits & (class_ids != NO_MATCH)
+		hits &= class_ids == NO_MATCH
+		class_ids[hits] = class_id
+		lengths[hits] = inst.bytecount
+
+	return SweepResult(
+		definitions=definitions,
+		class_ids=class_ids,
+		lengths=lengths,
+		conflicts=conflicts,
+	)
@@ -0,0 +1,234 @@
+"""Compact instruction storage."""
+
+from array import array
+from collections import Counter
+from typing import TYPE_CHECKING, Iterator, MutableMapping, Sequence, Type
+
+from k0s_dasm.ibase import Instruction
+
+if TYPE_CHECKING:
+	from k0s_dasm.base import Program
+
+NO_ROW = -1
+"""Row index for addresses where no instruction starts."""
+
+NO_NEXT = -0x80000000
+"""
+Next address column value for unused next address slots.
+
+Not -1: relative branches near the start of the image can target small
+negative addresses, so this is the lowest column value instead.
+"""
+
+COLUMNS = ("pcs", "class_ids", "words", "lengths", "next0", "next1")
+"""Names of the per-instruction columns."""
+
+
+class InstructionTable(MutableMapping[int, Instruction]):
+	"""
+	Struct-of-arrays store of decoded instructions, keyed by address.
+
+	Only the columns needed to reconstruct an instruction are kept: address,
+	class ID, raw word, byte count, and up to two next addresses, plus the
+	notes of the (few) instructions that have any. Getting an item
+	materializes a fresh Instruction view from those (as per
+	``Instruction.from_word``, with the stored next addresses and notes), so
+	changes to an instruction after it is stored are only kept by storing it
+	again.
+
+	Measured with tracemalloc on a synthetic 64 KiB image (``bench.synth``,
+	uniform mix, ~31k instructions), a dict of Instruction objects takes ~400
+	bytes per instruction; this table takes ~20 bytes per instruction plus 4
+	bytes per flash byte for the address index.
+	"""
+
+	def __init__(self, program: "Program") -> None:
+		"""Create an empty table for the given program."""
+		self.program = program
+		"""The containing Program."""
+
+		self.definitions: list[Type[Instruction]] = list(program.registry.definitions)
+		"""Instruction definitions, indexed by class ID."""
+
+		self._class_ids = {cls: idx for idx, cls in enumerate(self.definitions)}
+
+		self.pcs = array("I")
+		"""Address column."""
+
+		self.class_ids = array("h")
+		"""Class ID column, or ``NO_ROW`` for deleted rows."""
+
+		self.words = array("I")
+		"""Raw instruction word column."""
+
+		self.lengths = array("B")
+		"""Byte count column."""
+
+		self.next0 = array("i")
+		"""First next address column, or ``NO_NEXT``."""
+
+		self.next1 = array("i")
+		"""Second next address column, or ``NO_NEXT``."""
+
+		self.rows = array("i", [NO_ROW]) * len(program.flash)
+		"""Row index by address, or ``NO_ROW``."""
+
+		self.notes: dict[int, list[str]] = {}
+		"""Notes of the instructions that have any, by row index."""
+
+		self._count = 0
+
+	def class_id(self, cls: Type[Instruction]) -> int:
+		"""Get the class ID for an instruction definition."""
+		try:
+			return self._class_ids[cls]
+		except KeyError:
+			self.definitions.append(cls)
+			self._class_ids[cls] = len(self.definitions) - 1
+			return self._class_ids[cls]
+
+	def row(self, pc: int) -> int:
+		"""Get the row index of the instruction at an address, or ``NO_ROW``."""
+		if not 0 <= pc < len(self.rows):
+			return NO_ROW
+		return self.rows[pc]
+
+	def length_of(self, pc: int) -> int:
+		"""Get the byte count of the instruction at an address, or 0 if none."""
+		row = self.row(pc)
+		if row == NO_ROW:
+			return 0
+		return self.lengths[row]
+
+	def next_of(self, pc: int) -> Sequence[int]:
+		"""Get the next address(es) of an instruction, without materializing it."""
+		row = self.row(pc)
+		if row == NO_ROW:
+			raise KeyError(pc)
+		return self._nexts(row)
+
+	def _nexts(self, row: int) -> tuple[int, ...]:
+		"""Get the next address(es) stored in a row."""
+		return tuple([a for a in (self.next0[row], self.next1[row]) if a != NO_NEXT])
+
+	def class_counts(self) -> Counter[Type[Instruction]]:
+		"""Count the stored instructions by definition, without materializing."""
+		counts = Counter(self.class_ids)
+		counts.pop(NO_ROW, None)
+		return Counter({self.definitions[cid]: n for cid, n in counts.items()})
+
+	def columns(self) -> dict[str, array]:
+		"""Get copies of the columns, without deleted rows, in insertion order."""
+		live = [row for row, cid in enumerate(self.class_ids) if cid != NO_ROW]
+		out = {}
+		for name in COLUMNS:
+			column: array = getattr(self, name)
+			out[name] = array(column.typecode, [column[row] for row in live])
+		return out
+
+	def load_columns(
+		self, definitions: Sequence[Type[Instruction]], columns: dict[str, array]
+	) -> None:
+		"""
+		Bulk load instructions from columns as given by ``columns``.
+
+		Class IDs are per the given definitions. The table must be empty. The
+		instructions are trusted to decode as stored, and aren't decoded, but
+		the columns are checked to be consistent (raising ValueError if not)
+		before anything is loaded.
+		"""
+		if len(self.pcs):
+			raise ValueError("Can only load columns into an empty table")
+		count = len(columns["pcs"])
+		if any([len(columns[name]) != count for name in COLUMNS]):
+			raise ValueError("Columns have different lengths")
+		if any([not 0 <= cid < len(definitions) for cid in columns["class_ids"]]):
+			raise ValueError("Class ID out of range")
+		size = len(self.rows)
+		for pc, length in zip(columns["pcs"], columns["lengths"]):
+			if not (0 <= pc and 0 < length and pc + length <= size):
+				raise ValueError(f"Instruction at 0x{pc:04X} is outside the flash")
+		if len(set(columns["pcs"])) != count:
+			raise ValueError("Duplicate instruction addresses")
+
+		ids = [self.class_id(cls) for cls in definitions]
+		for name in COLUMNS:
+			getattr(self, name).extend(columns[name])
+		for row, cid in enumerate(self.class_ids):
+			self.class_ids[row] = ids[cid]
+		for row, pc in enumerate(self.pcs):
+			self.program.mark_code(pc, self.lengths[row])
+			self.rows[pc] = row
+		self._count = len(self.pcs)
+
+	def __setitem__(self, pc: int, inst: Instruction) -> None:
+		"""Store an instruction's columns."""
+		if pc != inst.pc:
+			raise ValueError(f"Instruction is at 0x{inst.pc:04X}, not 0x{pc:04X}")
+		if len(inst.next) > 2:
+			raise ValueError(f"Too many next addresses to store: {inst.next}")
+		nexts = list(inst.next) + [NO_NEXT] * (2 - len(inst.next))
+
+		row = self.row(pc)
+		if row == NO_ROW:
+			self.program.mark_code(pc, inst.bytecount)
+			row = len(self.pcs)
+			self.pcs.append(pc)
+			self.class_ids.append(self.class_id(type(inst)))
+			self.words.append(inst.word)
+			self.lengths.append(inst.bytecount)
+			self.next0.append(nexts[0])
+			self.next1.append(nexts[1])
+			self.rows[pc] = row
+			self._count += 1
+		else:
+			self.program.unmark_code(pc, self.lengths[row])
+			self.program.mark_code(pc, inst.bytecount)
+			self.class_ids[row] = self.class_id(type(inst))
+			self.words[row] = inst.word
+			self.lengths[row] = inst.bytecount
+			self.next0[row] = nexts[0]
+			self.next1[row] = nexts[1]
+		if inst.notes:
+			self.notes[row] = list(inst.notes)
+		else:
+			self.notes.pop(row, None)
+
+	def __getitem__(self, pc: int) -> Instruction:
+		"""Materialize the instruction at an address."""
+		row = self.row(pc)
+		if row == NO_ROW:
+			raise KeyError(pc)
+		cls = self.definitions[self.class_ids[row]]
+		inst = cls.from_word(self.program, pc, self.words[row])
+		if inst is None:
+			raise RuntimeError(f"Stored instruction at 0x{pc:04X} doesn't decode")
+		inst.next = self._nexts(row)
+		if row in self.notes:
+			inst.notes = list(self.notes[row])
+		return inst
+
+	def __delitem__(self, pc: int) -> None:
+		"""Remove the instruction at an address."""
+		row = self.row(pc)
+		if row == NO_ROW:
+			raise KeyError(pc)
+		self.class_ids[row] = NO_ROW
+		self.rows[pc] = NO_ROW
+		self.notes.pop(row, None)
+		self._count -= 1
+		self.program.unmark_code(pc, self.lengths[row])
+
+	def __contains__(self, pc: object) -> bool:
+		"""Check if an instruction starts at an address."""
+		return isinstance(pc, int) and self.row(pc) != NO_ROW
+
+	def __iter__(self) -> Iterator[int]:
+		"""Iterate over instruction addresses, in insertion order."""
+		for row, pc in enumerate(self.pcs):
+			if self.class_ids[row] != NO_ROW:
+				yield pc
+
+	def __len__(self) -> int:
+		"""Get the number of instructions stored."""
+		return self._count
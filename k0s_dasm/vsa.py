@@ -0,0 +1,617 @@
+"""
+Value-set analysis of registers, to resolve computed jumps (BR AX).
+
+The abstract state at each point is a set of register valuations: the eight
+8-bit registers, CY, Z, and the register last compared against a constant.
+Any of these may be ``TOP`` (unknown). Constant loads, 8/16-bit arithmetic and
+reads from flash (e.g. jump table entries via ``[HL]``) are evaluated per
+valuation, and conditional branches after a compare split an unknown index
+register into the values it can have on each edge. This is what bounds the
+index of a typical jump table sequence.
+
+Sets are collapsed into a single valuation (differing values become TOP) when
+they grow beyond ``MAX_STATES``, or after ``WIDEN_AFTER`` changes to a block's
+input, so the fixpoint is reached quickly. Calls make everything unknown.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Sequence, Type
+
+from k0s_dasm.base import Flash, Program
+from k0s_dasm.cfg import EDGE_CALL, NO_BLOCK, ControlFlowGraph
+from k0s_dasm.defs import Reg8
+from k0s_dasm.ibase import Instruction
+
+TOP = -1
+"""Unknown value."""
+
+MAX_STATES = 256
+"""Maximum number of valuations kept per block, before collapsing."""
+
+MAX_TARGETS = 256
+"""Maximum number of targets for a computed jump to count as resolved."""
+
+WIDEN_AFTER = 8
+"""Number of changes to a block's input before collapsing it."""
+
+_A = Reg8.A.value
+_X = Reg8.X.value
+_CY = 8
+_Z = 9
+_CMP = 10
+"""Compared register and constant, as ``reg << 8 | const``, or TOP."""
+
+_State = tuple[int, ...]
+_Regs = list[int]
+_Transfer = Callable[[_Regs, Sequence[int], Flash], Sequence[_Regs]]
+
+ALL_TOP: _State = (TOP,) * 11
+"""The valuation with nothing known."""
+
+_REFINE = {"BC": (_CY, 1), "BNC": (_CY, 0), "BZ": (_Z, 1), "BNZ": (_Z, 0)}
+"""Flag and value tested by each conditional branch, when branching."""
+
+
+def _flash_byte(flash: Flash, addr: int) -> int:
+	"""Read a flash byte, if the address is known and in the flash."""
+	if 0 <= addr < len(flash):
+		return flash[addr]
+	return TOP
+
+
+def _pair(regs: _Regs, rp: int) -> int:
+	"""Get a register pair value."""
+	lo = regs[2 * rp]
+	hi = regs[2 * rp + 1]
+	if lo == TOP or hi == TOP:
+		return TOP
+	return (hi << 8) | lo
+
+
+def _put(regs: _Regs, reg: int, val: int) -> None:
+	"""Set a register value, forgetting a compare of it."""
+	regs[reg] = val
+	if regs[_CMP] != TOP and regs[_CMP] >> 8 == reg:
+		regs[_CMP] = TOP
+
+
+def _put_pair(regs: _Regs, rp: int, val: int) -> None:
+	"""Set a register pair value."""
+	_put(regs, 2 * rp, TOP if val == TOP else val & 0xFF)
+	_put(regs, 2 * rp + 1, TOP if val == TOP else (val >> 8) & 0xFF)
+
+
+_Getter = Callable[[_Regs, Sequence[int], Flash], int]
+_Putter = Callable[[_Regs, Sequence[int], int], None]
+_Operand = tuple[_Getter, _Putter, int]
+
+
+def _operand(text: str, idx: int) -> _Operand:
+	"""
+	Get accessors for an operand, per its text in a mnemonic.
+
+	``idx`` is the index of the first field the operand uses; the number of
+	fields used is returned as well. Memory other than flash reads as TOP,
+	and writes to memory are ignored.
+	"""
+	used = 0
+	if text.endswith(".bit"):
+		text = text[: -len(".bit")]
+		used += 1
+
+	def nothing(regs: _Regs, vals: Sequence[int], val: int) -> None:
+		pass
+
+	def top(regs: _Regs, vals: Sequence[int], flash: Flash) -> int:
+		return TOP
+
+	if text in ("#byte", "#word"):
+		return (lambda regs, vals, flash: vals[idx]), nothing, used + 1
+	elif text == "r":
+		return (
+			(lambda regs, vals, flash: regs[vals[idx]]),
+			(lambda regs, vals, val: _put(regs, vals[idx], val)),
+			used + 1,
+		)
+	elif text in Reg8.__members__:
+		reg = Reg8[text].value
+		return (
+			(lambda regs, vals, flash: regs[reg]),
+			(lambda regs, vals, val: _put(regs, reg, val)),
+			used,
+		)
+	elif text == "rp":
+		return (
+			(lambda regs, vals, flash: _pair(regs, vals[idx])),
+			(lambda regs, vals, val: _put_pair(regs, vals[idx], val)),
+			used + 1,
+		)
+	elif text == "AX":
+		return (
+			(lambda regs, vals, flash: _pair(regs, 0)),
+			(lambda regs, vals, val: _put_pair(regs, 0, val)),
+			used,
+		)
+	elif text == "!addr16":
+		return (lambda regs, vals, flash: _flash_byte(flash, vals[idx])), nothing, used + 1
+	elif text == "[HL + byte]":
+
+		def hl_byte(regs: _Regs, vals: Sequence[int], flash: Flash) -> int:
+			hl = _pair(regs, 3)
+			return TOP if hl == TOP else _flash_byte(flash, hl + vals[idx])
+
+		return hl_byte, nothing, used + 1
+	elif text in ("[HL]", "[DE]"):
+		rp = 3 if text == "[HL]" else 2
+
+		def indirect(regs: _Regs, vals: Sequence[int], flash: Flash) -> int:
+			return _flash_byte(flash, _pair(regs, rp))
+
+		return indirect, nothing, used
+	elif text in ("saddr", "saddrp", "sfr", "$addr16", "[addr5]"):
+		return top, nothing, used + 1
+	else:
+		# PSW, SP, CY, "1" (rotate count)
+		return top, nothing, used
+
+
+def _arith(op: str, a: int, b: int, cy: int) -> tuple[int, int]:
+	"""Do 8-bit arithmetic, giving the result and CY."""
+	if op in ("ADD", "ADDC"):
+		res = a + b + (cy if op == "ADDC" else 0)
+	else:
+		res = a - b - (cy if op == "SUBC" else 0)
+	return res & 0xFF, (res >> 8) & 1
+
+
+def _alu(op: str, dst: _Operand, src: _Getter) -> _Transfer:
+	"""Make the transfer function of an 8-bit ALU instruction."""
+	get_dst, put_dst, _ = dst
+	with_cy = op in ("ADDC", "SUBC")
+
+	def run(regs: _Regs, vals: Sequence[int], flash: Flash) -> Sequence[_Regs]:
+		a = get_dst(regs, vals, flash)
+		b = src(regs, vals, flash)
+		cy = regs[_CY]
+		cmp = TOP
+		if a == TOP or b == TOP or (with_cy and cy == TOP):
+			res = TOP
+			if op not in ("AND", "OR", "XOR"):
+				cy = TOP
+			if op == "CMP" and a == TOP and b != TOP:
+				# remember the compare, to refine the register on branches
+				cmp = (_A << 8) | b
+		elif op == "AND":
+			res = a & b
+		elif op == "OR":
+			res = a | b
+		elif op == "XOR":
+			res = a ^ b
+		else:
+			res, cy = _arith("SUB" if op == "CMP" else op, a, b, cy)
+		if op != "CMP":
+			put_dst(regs, vals, res)
+		regs[_CY] = cy
+		regs[_Z] = TOP if res == TOP else int(res == 0)
+		regs[_CMP] = cmp
+		return (regs,)
+
+	return run
+
+
+def _alu16(op: str, src: _Getter) -> _Transfer:
+	"""Make the transfer function of a 16-bit ALU instruction (on AX)."""
+
+	def run(regs: _Regs, vals: Sequence[int], flash: Flash) -> Sequence[_Regs]:
+		a = _pair(regs, 0)
+		b = src(regs, vals, flash)
+		if a == TOP or b == TOP:
+			res = cy = TOP
+		else:
+			raw = a + b if op == "ADDW" else a - b
+			res, cy = raw & 0xFFFF, (raw >> 16) & 1
+		if op != "CMPW":
+			_put_pair(regs, 0, res)
+		regs[_CY] = cy
+		regs[_Z] = TOP if res == TOP else int(res == 0)
+		regs[_CMP] = TOP
+		return (regs,)
+
+	return run
+
+
+def _rotate(op: str) -> _Transfer:
+	"""Make the transfer function of a rotate of A."""
+
+	def run(regs: _Regs, vals: Sequence[int], flash: Flash) -> Sequence[_Regs]:
+		a = regs[_A]
+		cy = regs[_CY]
+		through = op in ("RORC", "ROLC")
+		if a == TOP or (through and cy == TOP):
+			res = new_cy = TOP
+		elif op in ("ROL", "ROLC"):
+			new_cy = a >> 7
+			res = ((a << 1) | (cy if through else new_cy)) & 0xFF
+		else:
+			new_cy = a & 1
+			res = (a >> 1) | ((cy if through else new_cy) << 7)
+		_put(regs, _A, res)
+		regs[_CY] = new_cy
+		regs[_CMP] = TOP
+		return (regs,)
+
+	return run
+
+
+def _set_psw(regs: _Regs, psw: int) -> None:
+	"""Set the flags from a PSW value."""
+	regs[_CY] = TOP if psw == TOP else psw & 1
+	regs[_Z] = TOP if psw == TOP else (psw >> 6) & 1
+	regs[_CMP] = TOP
+
+
+def _bit(op: str, target: str) -> _Transfer:
+	"""Make the transfer function of a single bit manipulation."""
+
+	def run(regs: _Regs, vals: Sequence[int], flash: Flash) -> Sequence[_Regs]:
+		if target == "CY":
+			cy = regs[_CY]
+			if op == "NOT1":
+				regs[_CY] = TOP if cy == TOP else cy ^ 1
+			else:
+				regs[_CY] = int(op == "SET1")
+			regs[_CMP] = TOP
+		elif target in ("A.bit", "PSW.bit"):
+			reg = _A if target == "A.bit" else None
+			mask = 1 << vals[0]
+			if reg is None:
+				# only CY (bit 0) and Z (bit 6) are tracked
+				flag = {0: _CY, 6: _Z}.get(vals[0])
+				if flag is not None:
+					regs[flag] = int(op == "SET1")
+				regs[_CMP] = TOP
+			elif regs[reg] != TOP:
+				val = regs[reg] | mask if op == "SET1" else regs[reg] & ~mask
+				_put(regs, reg, val)
+		return (regs,)
+
+	return run
+
+
+def _clobber(regs: _Regs, vals: Sequence[int], flash: Flash) -> Sequence[_Regs]:
+	"""Make everything unknown (e.g. calls, or unknown instructions)."""
+	return (list(ALL_TOP),)
+
+
+def _keep(regs: _Regs, vals: Sequence[int], flash: Flash) -> Sequence[_Regs]:
+	"""Change nothing tracked."""
+	return (regs,)
+
+
+def _flags_unknown(
+	regs: _Regs, vals: Sequence[int], flash: Flash
+) -> Sequence[_Regs]:
+	"""Make the flags unknown (ALU operations on memory)."""
+	regs[_CY] = regs[_Z] = regs[_CMP] = TOP
+	return (regs,)
+
+
+def _move(op: str, texts: Sequence[str], operands: Sequence[_Operand]) -> _Transfer:
+	"""Make the transfer function of a data transfer instruction."""
+	if op == "MOV" and texts[0] == "PSW":
+		get_psw = operands[1][0]
+
+		def move_psw(regs: _Regs, vals: Sequence[int], flash: Flash) -> Sequence[_Regs]:
+			_set_psw(regs, get_psw(regs, vals, flash))
+			return (regs,)
+
+		return move_psw
+	elif op in ("XCH", "XCHW"):
+		(get_a, put_a, _), (get_b, put_b, _) = operands
+
+		def exchange(regs: _Regs, vals: Sequence[int], flash: Flash) -> Sequence[_Regs]:
+			a = get_a(regs, vals, flash)
+			put_a(regs, vals, get_b(regs, vals, flash))
+			put_b(regs, vals, a)
+			return (regs,)
+
+		return exchange
+	elif op == "POP":
+		put = operands[0][1]
+
+		def pop(regs: _Regs, vals: Sequence[int], flash: Flash) -> Sequence[_Regs]:
+			if texts[0] == "PSW":
+				_set_psw(regs, TOP)
+			else:
+				put(regs, vals, TOP)
+			return (regs,)
+
+		return pop
+
+	get_src = operands[1][0]
+	put_dst = operands[0][1]
+
+	def move(regs: _Regs, vals: Sequence[int], flash: Flash) -> Sequence[_Regs]:
+		put_dst(regs, vals, get_src(regs, vals, flash))
+		return (regs,)
+
+	return move
+
+
+def _count(op: str, operand: _Operand) -> _Transfer:
+	"""Make the transfer function of an increment or decrement."""
+	get, put, _ = operand
+	step = 1 if op in ("INC", "INCW") else -1
+	mask = 0xFFFF if op in ("INCW", "DECW") else 0xFF
+	flags = op in ("INC", "DEC")
+
+	def count(regs: _Regs, vals: Sequence[int], flash: Flash) -> Sequence[_Regs]:
+		val = get(regs, vals, flash)
+		if val != TOP:
+			val = (val + step) & mask
+		put(regs, vals, val)
+		if flags:
+			regs[_Z] = TOP if val == TOP else int(val == 0)
+			regs[_CMP] = TOP
+		return (regs,)
+
+	return count
+
+
+_PLAIN: dict[str, _Transfer] = {
+	"CALL": _clobber,
+	"CALLT": _clobber,
+	**dict.fromkeys(["PUSH", "BR", "BC", "BNC", "BZ", "BNZ", "BT", "BF"], _keep),
+	**dict.fromkeys(["RET", "RETI", "NOP", "EI", "DI", "HALT", "STOP"], _keep),
+}
+"""Transfer functions of instructions that don't depend on operands."""
+
+
+def _compile(cls: Type[Instruction]) -> _Transfer:
+	"""
+	Make the transfer function of an instruction definition.
+
+	Semantics are found from the mnemonic. Anything not understood makes
+	everything unknown.
+	"""
+	op, _, rest = cls.mnemonic.partition(" ")
+	texts = [text.strip() for text in rest.split(",")] if rest else []
+	operands = []
+	idx = 0
+	for text in texts:
+		acc = _operand(text, idx)
+		operands.append(acc)
+		idx += acc[2]
+
+	if op in ("MOV", "MOVW", "XCH", "XCHW", "POP"):
+		return _move(op, texts, operands)
+	elif op in ("ADD", "ADDC", "SUB", "SUBC", "AND", "OR", "XOR", "CMP"):
+		if texts[0] != "A":
+			return _flags_unknown
+		return _alu(op, operands[0], operands[1][0])
+	elif op in ("ADDW", "SUBW", "CMPW"):
+		return _alu16(op, operands[1][0])
+	elif op in ("INC", "DEC", "INCW", "DECW", "DBNZ"):
+		return _count(op, operands[0])
+	elif op in ("ROR", "ROL", "RORC", "ROLC"):
+		return _rotate(op)
+	elif op in ("SET1", "CLR1", "NOT1"):
+		return _bit(op, texts[0] if texts[0] in ("CY", "A.bit", "PSW.bit") else "")
+	return _PLAIN.get(op, _clobber)
+
+
+_transfers: dict[Type[Instruction], _Transfer] = {}
+"""Compiled transfer functions, by instruction definition."""
+
+
+def transfer(cls: Type[Instruction]) -> _Transfer:
+	"""Get the transfer function of an instruction definition."""
+	try:
+		return _transfers[cls]
+	except KeyError:
+		_transfers[cls] = _compile(cls)
+		return _transfers[cls]
+
+
+def _collapse(states: Iterable[_State]) -> _State:
+	"""Merge valuations into one, with any differing values unknown."""
+	it = iter(states)
+	merged = list(next(it))
+	for state in it:
+		for idx, val in enumerate(state):
+			if merged[idx] != val:
+				merged[idx] = TOP
+	return tuple(merged)
+
+
+def _refine(states: frozenset[_State], flag: int, want: int) -> frozenset[_State]:
+	"""Keep the valuations where a flag can have a value, splitting if needed."""
+	out: set[_State] = set()
+	for state in states:
+		if state[flag] == want:
+			out.add(state)
+		elif state[flag] != TOP:
+			continue
+		elif state[_CMP] == TOP or (flag == _Z and want == 0):
+			out.add(state[:flag] + (want,) + state[flag + 1 :])
+		else:
+			# split the compared (unknown) register by the compare outcome
+			reg, const = state[_CMP] >> 8, state[_CMP] & 0xFF
+			if flag == _Z:
+				vals: Sequence[int] = (const,)
+			elif want:
+				vals = range(const)
+			else:
+				vals = range(const, 0x100)
+			if len(vals) > MAX_STATES:
+				out.add(state[:flag] + (want,) + state[flag + 1 :])
+				continue
+			for val in vals:
+				split = list(state)
+				split[reg] = val
+				split[_CY] = int(val < const)
+				split[_Z] = int(val == const)
+				out.add(tuple(split))
+	return frozenset(out)
+
+
+@dataclass
+class ValueSetResult:
+	"""Results of a value-set analysis run."""
+
+	jumps: dict[int, tuple[int, ...]] = field(default_factory=dict)
+	"""Resolved computed jump targets, by jump instruction address."""
+
+	unresolved: list[int] = field(default_factory=list)
+	"""Addresses of computed jumps that couldn't be resolved."""
+
+	steps: int = 0
+	"""Block transfers evaluated."""
+
+	complete: bool = True
+	"""False if the step budget ran out (no jumps are resolved then)."""
+
+
+class ValueSetAnalysis:
+	"""Value-set analysis over a control flow graph."""
+
+	def __init__(self, cfg: ControlFlowGraph, max_steps: int | None = None) -> None:
+		"""Set up the analysis; the default budget scales with the graph size."""
+		self.cfg = cfg
+		"""The graph to analyze."""
+
+		self.max_steps = max_steps if max_steps is not None else 64 * len(cfg) + 1024
+		"""Maximum number of block transfers before giving up."""
+
+		self._code: list[list[tuple[_Transfer, tuple[int, ...], str]] | None]
+		self._code = [None] * len(cfg)
+
+	def _block_code(self, blk: int) -> list[tuple[_Transfer, tuple[int, ...], str]]:
+		"""Get the transfer functions and operand values of a block."""
+		code = self._code[blk]
+		if code is None:
+			code = []
+			for pc in self.cfg.instructions(blk):
+				inst = self.cfg.program.instrs[pc]
+				code.append((transfer(type(inst)), inst.values, inst.mnemonic))
+			self._code[blk] = code
+		return code
+
+	def _run_block(
+		self, blk: int, states: frozenset[_State], count: int | None = None
+	) -> frozenset[_State]:
+		"""Evaluate (some of) the instructions of a block."""
+		flash = self.cfg.program.flash
+		code = self._block_code(blk)
+		for run, vals, _ in code[:count]:
+			out: set[_State] = set()
+			for state in states:
+				out.update([tuple(regs) for regs in run(list(state), vals, flash)])
+			if len(out) > MAX_STATES:
+				out = {_collapse(out)}
+			states = frozenset(out)
+		return states
+
+	def run(self) -> ValueSetResult:
+		"""Run to a fixpoint, then resolve the computed jumps."""
+		cfg = self.cfg
+		result = ValueSetResult()
+		entries = {cfg.block_at(pc) for pc in cfg.program.entry_points()}
+		inputs: list[frozenset[_State] | None] = [None] * len(cfg)
+		changes = [0] * len(cfg)
+		queued = [False] * len(cfg)
+		work: list[int] = []
+		for blk in range(len(cfg)):
+			if blk in entries or not len(cfg.predecessors(blk)):
+				inputs[blk] = frozenset([ALL_TOP])
+				queued[blk] = True
+				work.append(blk)
+
+		while work:
+			blk = work.pop()
+			queued[blk] = False
+			result.steps += 1
+			if result.steps > self.max_steps:
+				result.complete = False
+				result.unresolved = self._jumps()
+				return result
+
+			states = inputs[blk]
+			assert states is not None
+			out = self._run_block(blk, states)
+			_, vals, mnemonic = self._block_code(blk)[-1]
+			refine = _REFINE.get(mnemonic.partition(" ")[0])
+			end = cfg.ends[blk]
+			for edge in cfg.edges(blk):
+				if edge.dst == NO_BLOCK:
+					continue
+				edge_states = out
+				if edge.kind == EDGE_CALL:
+					edge_states = frozenset([ALL_TOP])
+				elif refine is not None and vals[0] != end:
+					flag, taken = refine
+					want = taken if edge.addr != end else taken ^ 1
+					edge_states = _refine(out, flag, want)
+				if not edge_states:
+					continue
+
+				old = inputs[edge.dst]
+				new = edge_states if old is None else old | edge_states
+				if new == old:
+					continue
+				changes[edge.dst] += 1
+				if len(new) > MAX_STATES or changes[edge.dst] > WIDEN_AFTER:
+					new = frozenset([_collapse(new)])
+					if new == old:
+						continue
+				inputs[edge.dst] = new
+				if not queued[edge.dst]:
+					queued[edge.dst] = True
+					work.append(edge.dst)
+
+		for blk in range(len(cfg)):
+			self._resolve(blk, inputs[blk], result)
+		return result
+
+	def _jumps(self) -> list[int]:
+		"""Get the addresses of all computed jumps (BR AX)."""
+		pcs = []
+		for blk in range(len(self.cfg)):
+			pc = self.cfg.instructions(blk)[-1]
+			if self.cfg.program.instrs[pc].mnemonic == "BR AX":
+				pcs.append(pc)
+		return pcs
+
+	def _resolve(
+		self, blk: int, states: frozenset[_State] | None, result: ValueSetResult
+	) -> None:
+		"""Resolve the targets of a block ending in a computed jump, if it does."""
+		code = self._block_code(blk)
+		if code[-1][2] != "BR AX":
+			return
+		pc = self.cfg.instructions(blk)[-1]
+		if states is None:
+			result.unresolved.append(pc)
+			return
+		targets: set[int] = set()
+		for state in self._run_block(blk, states, len(code) - 1):
+			if state[_A] == TOP or state[_X] == TOP:
+				result.unresolved.append(pc)
+				return
+			targets.add((state[_A] << 8) | state[_X])
+		flash_size = len(self.cfg.program.flash)
+		targets = {target for target in targets if target < flash_size}
+		if not targets or len(targets) > MAX_TARGETS:
+			result.unresolved.append(pc)
+			return
+		result.jumps[pc] = tuple(sorted(targets))
+
+
+def resolve_jumps(
+	program: Program,
+	indirect: dict[int, tuple[int, ...]] | None = None,
+	max_steps: int | None = None,
+) -> ValueSetResult:
+	"""Build the control flow graph and resolve its computed jumps."""
+	cfg = ControlFlowGraph.build(program, indirect=indirect)
+	return ValueSetAnalysis(cfg, max_steps).run()
@@ -0,0 +1,167 @@
+"""Cross-reference index of addresses used by instructions."""
+
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Any, Iterator, Sequence, Type
+
+from k0s_dasm.flow import CallReturn, ConditionalBranch, UnconditionalBranch
+from k0s_dasm.ibase import Instruction
+
+XREF_READ = 1
+"""Xref kind flag: the address is read."""
+
+XREF_WRITE = 2
+"""Xref kind flag: the address is written."""
+
+XREF_BRANCH = 4
+"""Xref kind flag: the address is branched to."""
+
+XREF_CALL = 8
+"""Xref kind flag: the address is called."""
+
+_WRITES = ("MOV", "MOVW")
+"""Mnemonics that only write their first operand."""
+
+_READS = ("CMP", "CMPW", "BT", "BF")
+"""Mnemonics that only read their first operand."""
+
+_EXCHANGES = ("XCH", "XCHW")
+"""Mnemonics that read and write all operands."""
+
+
+def access_kinds(cls: Type[Instruction]) -> tuple[int, ...]:
+	"""
+	Get the xref kind of each field of an instruction definition.
+
+	Fields that aren't addresses get 0. Data accesses are inferred from the
+	mnemonic and whether the field is the first (destination) operand;
+	otherwise, the first operand of arithmetic etc. is read-modify-write.
+	"""
+	op, _, operands = cls.format.partition(" ")
+	first = operands.split(",")[0]
+	branch_idx = None
+	if isinstance(cls.flow, (ConditionalBranch, UnconditionalBranch)):
+		branch_idx = cls.flow.branch_field_idx
+	call = isinstance(cls.flow, CallReturn)
+
+	kinds: list[int] = []
+	for idx, fdef in enumerate(cls.field_defs):
+		if not fdef.is_addr:
+			kinds.append(0)
+		elif fdef.is_branch or idx == branch_idx:
+			kinds.append(XREF_CALL if call else XREF_BRANCH)
+		elif op in _EXCHANGES:
+			kinds.append(XREF_READ | XREF_WRITE)
+		elif f"{{{idx}}}" not in first or op in _READS:
+			kinds.append(XREF_READ)
+		elif op in _WRITES:
+			kinds.append(XREF_WRITE)
+		else:
+			kinds.append(XREF_READ | XREF_WRITE)
+	return tuple(kinds)
+
+
+@dataclass(frozen=True)
+class Xref:
+	"""A reference to an address by an instruction."""
+
+	addr: int
+	"""The referenced address."""
+
+	pc: int
+	"""Address of the referencing instruction."""
+
+	kind: int
+	"""XREF_* flags."""
+
+
+@dataclass(frozen=True)
+class XrefIndex:
+	"""
+	Cross-references, sorted by referenced address then instruction address.
+
+	Stored as parallel arrays; lookups and range queries are binary searches.
+	"""
+
+	addrs: array
+	"""Referenced address column."""
+
+	pcs: array
+	"""Referencing instruction address column."""
+
+	kinds: array
+	"""XREF_* flags column."""
+
+	def __len__(self) -> int:
+		"""Get the number of xrefs."""
+		return len(self.addrs)
+
+	def __iter__(self) -> Iterator[Xref]:
+		"""Iterate over all xrefs, in order."""
+		return self._slice(0, len(self.addrs))
+
+	def refs_to(self, addr: int) -> list[Xref]:
+		"""Get the xrefs to an address."""
+		return self.refs_in(addr, addr + 1)
+
+	def refs_in(self, start: int, end: int) -> list[Xref]:
+		"""Get the xrefs to an address range, with exclusive end."""
+		lo = bisect_left(self.addrs, start)
+		hi = bisect_left(self.addrs, end, lo)
+		return list(self._slice(lo, hi))
+
+	def targets(self) -> Sequence[int]:
+		"""Get all distinct referenced addresses, sorted."""
+		return sorted(set(self.addrs))
+
+	def _slice(self, lo: int, hi: int) -> Iterator[Xref]:
+		"""Get xrefs by index range."""
+		for idx in range(lo, hi):
+			yield Xref(addr=self.addrs[idx], pc=self.pcs[idx], kind=self.kinds[idx])
+
+	def to_dict(self) -> dict[str, Any]:
+		"""Get a JSON-compatible form."""
+		return {
+			"addrs": self.addrs.tolist(),
+			"pcs": self.pcs.tolist(),
+			"kinds": self.kinds.tolist(),
+		}
+
+	@classmethod
+	def from_dict(cls, data: dict[str, Any]) -> "XrefIndex":
+		"""Load from the form given by ``to_dict``."""
+		return cls(
+			addrs=array("i", data["addrs"]),
+			pcs=array("I", data["pcs"]),
+			kinds=array("B", data["kinds"]),
+		)
+
+
+class XrefCollector:
+	"""Collects xrefs from instructions as they are decoded."""
+
+	def __init__(self) -> None:
+		"""Create an empty collector."""
+		self._kinds: dict[Type[Instruction], tuple[int, ...]] = {}
+		self._refs: list[tuple[int, int, int]] = []
+
+	def add(self, inst: Instruction) -> None:
+		"""Collect the xrefs of an instruction."""
+		cls = type(inst)
+		try:
+			kinds = self._kinds[cls]
+		except KeyError:
+			kinds = self._kinds[cls] = access_kinds(cls)
+		for val, kind in zip(inst.values, kinds):
+			if kind:
+				self._refs.append((val, inst.pc, kind))
+
+	def index(self) -> XrefIndex:
+		"""Get the index of all xrefs collected so far."""
+		self._refs.sort()
+		return XrefIndex(
+			addrs=array("i", [addr for addr, _, _ in self._refs]),
+			pcs=array("I", [pc for _, pc, _ in self._refs]),
+			kinds=array("B", [kind for _, _, kind in self._refs]),
+		)
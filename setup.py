@@ -62,7 +62,7 @@ setup(
 	setup_requires=["setuptools_scm"],
 	packages=["k0s_dasm"],
 	scripts=[],
-	entry_points={},
+	entry_points={"console_scripts": ["k0s-dasm=k0s_dasm.cli:main"]},
 	cmdclass={"checkfmt": CheckFormat},
 	extras_require={
 		"dev": [
@@ -74,6 +74,7 @@ setup(
 			"isort",
 			"mypy",
 			"mypy-extensions",
+			"numpy",
 			"pep8-naming",
 			"pydocstyle",
 			"setuptools",
@@ -81,7 +82,8 @@ setup(
 			"sphinx",
 			"typing_extensions",
 			"wheel",
-		]
+		],
+		"numpy": ["numpy"],
 	},
 	test_suite="tests",
 )